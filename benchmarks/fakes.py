@@ -0,0 +1,157 @@
+"""Local stand-ins for TonAPI, DeDust and Telegram used by the benchmarks."""
+
+import asyncio
+import datetime
+import random
+from collections import Counter
+from typing import Any, AsyncGenerator, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import Chat, ChatInviteLink, Message, User
+from pytonapi.exceptions import TONAPIServerError, TONAPITooManyRequestsError
+from pytoniq_core import Address
+
+from bot.db.utils.unitofwork import UnitOfWork
+from bot.middlewares.util_middleware import DeDustHelper
+from bot.utils.balance_providers import BalanceProvider
+
+
+class FakeBalanceProvider(BalanceProvider):
+    """
+    Balance provider answering from a dict of wallet balances.
+
+    :param balances: Wallet -> balance served for every jetton looked up.
+    :param delay: Mean latency of a lookup in seconds.
+    :param error_rate: Share of lookups failing with a server error.
+    :param rate_limit_rate: Share of lookups failing with HTTP 429.
+    """
+
+    def __init__(
+        self,
+        balances: dict[str, int],
+        name: str = "tonapi",
+        delay: float = 0,
+        error_rate: float = 0,
+        rate_limit_rate: float = 0,
+        seed: int = 0,
+    ) -> None:
+        super().__init__()
+        self.name = name
+        self.balances = balances
+        self.delay = delay
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.calls = Counter()
+
+    async def _get_jetton_balances(
+        self, wallet: str, jetton_addrs: tuple[str, ...]
+    ) -> dict[str, int]:
+        if self.delay:
+            # exponential latencies give a realistic long tail
+            await asyncio.sleep(self.random.expovariate(1 / self.delay))
+
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            self.calls["rate_limited"] += 1
+            raise TONAPITooManyRequestsError("rate limit exceeded")
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.calls["error"] += 1
+            raise TONAPIServerError("internal server error")
+
+        self.calls["ok"] += 1
+        # the sweep sums WON and WON LP, put the whole balance on the first one
+        balances = {jetton_addr: 0 for jetton_addr in jetton_addrs}
+        balances[jetton_addrs[0]] = self.balances.get(wallet, 0)
+        return balances
+
+
+class FakeDeDustHelper(DeDustHelper):
+    """DeDust helper fetching a fixed price after a delay, samples are stored."""
+
+    def __init__(
+        self, uow: UnitOfWork, price: float = 0.01, latency: float = 0
+    ) -> None:
+        super().__init__(provider=None, uow=uow)
+        self.price = price
+        self.latency = latency
+        self.calls = 0
+
+    async def fetch_jetton_price(self, jetton_addr: str) -> float:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self.price
+
+
+class RecordingSession(BaseSession):
+    """
+    Bot session recording Telegram API calls instead of making them.
+
+    :param latency: Latency of every call in seconds.
+    """
+
+    def __init__(self, latency: float = 0) -> None:
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self.bot_user = User(id=1, is_bot=True, first_name="bench")
+
+    def _invite_link(self, method: TelegramMethod) -> ChatInviteLink:
+        expire_date = getattr(method, "expire_date", None) or datetime.datetime.now(
+            datetime.timezone.utc
+        ) + datetime.timedelta(days=1)
+        return ChatInviteLink(
+            invite_link=getattr(method, "invite_link", None)
+            or f"https://t.me/+bench{sum(self.calls.values())}",
+            creator=self.bot_user,
+            creates_join_request=False,
+            is_primary=False,
+            is_revoked=method.__api_method__ == "revokeChatInviteLink",
+            expire_date=expire_date,
+        )
+
+    async def make_request(
+        self,
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+        timeout: Optional[int] = None,
+    ) -> TelegramType:
+        self.calls[method.__api_method__] += 1
+        await asyncio.sleep(self.latency)
+
+        if method.__api_method__ in (
+            "createChatInviteLink",
+            "editChatInviteLink",
+            "revokeChatInviteLink",
+        ):
+            return self._invite_link(method)
+        if method.__api_method__ == "sendMessage":
+            return Message(
+                message_id=self.calls["sendMessage"],
+                date=datetime.datetime.now(datetime.timezone.utc),
+                chat=Chat(id=method.chat_id, type="private"),
+                text=method.text,
+            )
+        return True
+
+    async def stream_content(
+        self,
+        url: str,
+        headers: Optional[dict[str, Any]] = None,
+        timeout: int = 30,
+        chunk_size: int = 65536,
+        raise_for_status: bool = True,
+    ) -> AsyncGenerator[bytes, None]:
+        raise NotImplementedError
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def fake_wallet(index: int) -> str:
+    """Returns a valid user-friendly address unique for the index."""
+    return Address((0, index.to_bytes(32, "big"))).to_str()
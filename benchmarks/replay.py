@@ -0,0 +1,314 @@
+"""
+Replays wallet balance timelines through the sweep's decision logic.
+
+Sweeps run on a simulated clock every --refresh-timeout seconds, users are
+looked up one after another like ``fetch_balances`` does, and every user
+is classified by ``decide_actions`` and debounced by ``FlipGuard`` exactly
+as in ``task_update_users``. Nothing touches the network or the database.
+
+Balances are read from a CSV with ``time,wallet,balance[,og]`` rows (time
+in unix seconds or ISO 8601); they can be exported from the history table
+with::
+
+    SELECT h.created_at AS time, u.wallet, u.entry_balance
+           + SUM(h.balance_delta) OVER (PARTITION BY u.id ORDER BY h.id) AS balance,
+           u.og
+    FROM history h JOIN users u ON u.id = h.user_id ORDER BY h.created_at;
+
+Without --balances a synthetic timeline is generated. Prices from --prices
+(``time,price`` rows, e.g. ``SELECT created_at AS time, price FROM prices``)
+are attached to the actions.
+
+Usage::
+
+    python -m benchmarks.replay --synthetic 1000 --hours 72 --refresh-timeout 600
+"""
+
+import argparse
+import bisect
+import csv
+import datetime
+import random
+import statistics
+from dataclasses import dataclass, field
+from typing import Optional
+
+from bot.utils.decisions import (
+    BAN,
+    BLACKLIST,
+    BUY,
+    SELL,
+    UNBAN,
+    decide_actions,
+    guard_action,
+)
+from bot.utils.hysteresis import FlipGuard
+
+# Telegram requests performed by the outbox dispatcher per action, including
+# the invite links revoked on ban and taken from the pool (renamed, then
+# replaced by the refill) on unban, the user message and the admin notice
+TELEGRAM_CALLS = {BAN: 6, BLACKLIST: 5, UNBAN: 8, BUY: 1, SELL: 1}
+
+
+@dataclass
+class Timeline:
+    wallet: str
+    og: bool
+    times: list[float] = field(default_factory=list)
+    balances: list[int] = field(default_factory=list)
+
+    def balance_at(self, time: float) -> int:
+        """Returns the last known balance at the time."""
+        index = bisect.bisect_right(self.times, time) - 1
+        return self.balances[max(index, 0)]
+
+
+@dataclass
+class UserState:
+    timeline: Timeline
+    stored_balance: int
+    banned: bool
+    threshold: int
+    # time the balance dropped below the threshold / recovered above it
+    dropped_at: Optional[float] = None
+    recovered_at: Optional[float] = None
+    # next timeline sample to look at for crossings
+    scanned: int = 1
+    flips: int = 0
+    # dips below the threshold that recovered before the user got banned
+    missed_dips: int = 0
+
+
+def parse_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def load_timelines(path: str) -> list[Timeline]:
+    timelines: dict[str, Timeline] = {}
+    with open(path, newline="") as file:
+        for row in csv.DictReader(file):
+            wallet = row["wallet"]
+            if wallet not in timelines:
+                og = row.get("og", "").lower() in ("1", "true", "t", "yes")
+                timelines[wallet] = Timeline(wallet=wallet, og=og)
+            timelines[wallet].times.append(parse_time(row["time"]))
+            timelines[wallet].balances.append(int(float(row["balance"])))
+
+    for timeline in timelines.values():
+        samples = sorted(zip(timeline.times, timeline.balances))
+        timeline.times = [time for time, _ in samples]
+        timeline.balances = [balance for _, balance in samples]
+    return list(timelines.values())
+
+
+def load_prices(path: str) -> tuple[list[float], list[float]]:
+    with open(path, newline="") as file:
+        samples = sorted(
+            (parse_time(row["time"]), float(row["price"]))
+            for row in csv.DictReader(file)
+        )
+    return [time for time, _ in samples], [price for _, price in samples]
+
+
+def generate_timelines(
+    wallets: int, hours: float, threshold: int, rng: random.Random
+) -> list[Timeline]:
+    """
+    Random walks of balances, a fifth of them hovering around the threshold.
+    """
+    duration = hours * 3600
+    timelines = []
+    for i in range(wallets):
+        hovering = rng.random() < 0.2
+        balance = threshold * (
+            rng.uniform(0.9, 1.1) if hovering else rng.uniform(0.5, 3)
+        )
+        step = threshold * (0.05 if hovering else 0.4)
+        timeline = Timeline(
+            wallet=f"wallet{i}", og=False, times=[0], balances=[int(balance)]
+        )
+        time = 0.0
+        while True:
+            # about one transfer every two hours
+            time += rng.expovariate(1 / 7200)
+            if time >= duration:
+                break
+            balance = max(balance + rng.gauss(0, step), 0)
+            timeline.times.append(time)
+            timeline.balances.append(int(balance))
+        timelines.append(timeline)
+    return timelines
+
+
+def track_crossings(user: UserState, until: float) -> None:
+    """Updates when the user's balance last crossed the threshold before `until`."""
+    timeline = user.timeline
+    end = bisect.bisect_right(timeline.times, until)
+    for index in range(user.scanned, end):
+        below = timeline.balances[index] < user.threshold
+        was_below = timeline.balances[index - 1] < user.threshold
+        if below and not was_below:
+            user.dropped_at = timeline.times[index]
+        elif was_below and not below:
+            user.recovered_at = timeline.times[index]
+            if not user.banned:
+                user.missed_dips += 1
+    user.scanned = max(user.scanned, end)
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def simulate(
+    timelines: list[Timeline],
+    prices: tuple[list[float], list[float]],
+    args: argparse.Namespace,
+) -> dict:
+    flip_guard = FlipGuard(confirmations=args.confirmations)
+    users = []
+    for timeline in timelines:
+        threshold = args.og_threshold if timeline.og else args.threshold
+        users.append(
+            UserState(
+                timeline=timeline,
+                stored_balance=timeline.balances[0],
+                banned=timeline.balances[0] < threshold,
+                threshold=threshold,
+            )
+        )
+
+    start = min(timeline.times[0] for timeline in timelines)
+    end = max(timeline.times[-1] for timeline in timelines)
+    ban_latencies, unban_latencies = [], []
+    action_counts = {action: 0 for action in TELEGRAM_CALLS}
+    action_prices = []
+    suppressed = 0
+    sweeps = 0
+    sweep_durations = []
+
+    sweep_start = start + args.refresh_timeout
+    while sweep_start <= end + args.refresh_timeout:
+        sweeps += 1
+        # users are looked up one by one with a pause every batch
+        check_times = [
+            sweep_start + i * args.lookup_time + (i // 99) * args.rate_limit_pause
+            for i in range(len(users))
+        ]
+        balances = [
+            user.timeline.balance_at(time) for user, time in zip(users, check_times)
+        ]
+        actions = decide_actions(
+            balances=balances,
+            stored_balances=[user.stored_balance for user in users],
+            og=[user.timeline.og for user in users],
+            banned=[user.banned for user in users],
+            blacklisted=[False] * len(users),
+            listed=[False] * len(users),
+            threshold=args.threshold,
+            og_threshold=args.og_threshold,
+            band=args.band,
+        )
+
+        for user_id, (user, action, balance, time) in enumerate(
+            zip(users, actions, balances, check_times)
+        ):
+            track_crossings(user, time)
+            action, was_suppressed = guard_action(
+                action, flip_guard, user_id, balance, user.stored_balance
+            )
+            suppressed += was_suppressed
+            if action is None:
+                continue
+
+            action_counts[action] += 1
+            if prices[0]:
+                index = bisect.bisect_right(prices[0], time) - 1
+                action_prices.append(prices[1][max(index, 0)])
+            if action == BAN:
+                user.banned = True
+                user.flips += 1
+                if user.dropped_at is not None:
+                    ban_latencies.append(time - user.dropped_at)
+            elif action == UNBAN:
+                user.banned = False
+                user.flips += 1
+                if user.recovered_at is not None:
+                    unban_latencies.append(time - user.recovered_at)
+            user.stored_balance = balance
+
+        duration = check_times[-1] - sweep_start if check_times else 0
+        sweep_durations.append(duration)
+        # the scheduler skips runs while the previous sweep is still going
+        skipped = int(duration // args.refresh_timeout)
+        sweep_start += args.refresh_timeout * (skipped + 1)
+
+    telegram_calls = sum(
+        TELEGRAM_CALLS[action] * count for action, count in action_counts.items()
+    )
+    hours = max((end - start) / 3600, 1 / 3600)
+    return {
+        "users": len(users),
+        "hours": round(hours, 1),
+        "sweeps": sweeps,
+        "sweep_duration": round(statistics.mean(sweep_durations), 1),
+        "ban_latency_p50": percentile(ban_latencies, 0.5),
+        "ban_latency_p95": percentile(ban_latencies, 0.95),
+        "ban_latency_max": max(ban_latencies, default=None),
+        "unban_latency_p50": percentile(unban_latencies, 0.5),
+        "unban_latency_p95": percentile(unban_latencies, 0.95),
+        "actions": action_counts,
+        "missed_dips": sum(user.missed_dips for user in users),
+        "flips": sum(user.flips for user in users),
+        "users_flipping_more_than_twice": sum(user.flips > 2 for user in users),
+        "flips_suppressed": suppressed,
+        "telegram_calls": telegram_calls,
+        "telegram_calls_per_hour": round(telegram_calls / hours, 1),
+        "mean_action_price": (
+            round(statistics.mean(action_prices), 6) if action_prices else None
+        ),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--balances", help="CSV with time,wallet,balance[,og] rows")
+    source.add_argument("--synthetic", type=int, help="number of synthetic wallets")
+    parser.add_argument("--hours", type=float, default=72)
+    parser.add_argument("--prices", help="CSV with time,price rows")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threshold", type=int, default=1000)
+    parser.add_argument("--og-threshold", type=int, default=500)
+    parser.add_argument("--band", type=int, default=0)
+    parser.add_argument("--confirmations", type=int, default=1)
+    parser.add_argument("--refresh-timeout", type=float, default=600)
+    parser.add_argument(
+        "--lookup-time", type=float, default=0.1, help="seconds per balance lookup"
+    )
+    parser.add_argument("--rate-limit-pause", type=float, default=1)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.balances:
+        timelines = load_timelines(args.balances)
+    else:
+        timelines = generate_timelines(
+            args.synthetic, args.hours, args.threshold, random.Random(args.seed)
+        )
+    prices = load_prices(args.prices) if args.prices else ([], [])
+
+    for key, value in simulate(timelines, prices, args).items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
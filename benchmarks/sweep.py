@@ -0,0 +1,273 @@
+"""
+Benchmarks ``task_update_users`` against local stand-ins.
+
+TonAPI, DeDust and Telegram are replaced by the fakes from
+``benchmarks.fakes``, the database is a real Postgres one since the
+repositories rely on Postgres features. The database named by --db-name
+is dropped and re-seeded for every run, so it must be a dedicated one.
+
+Usage::
+
+    python -m benchmarks.sweep --users 1000 10000 100000 --json bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--db-name", default="bot_bench")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--latency", type=float, default=0.01, help="mean TonAPI latency, s"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.01)
+    parser.add_argument("--price-latency", type=float, default=0.2)
+    parser.add_argument("--telegram-latency", type=float, default=0.05)
+    parser.add_argument(
+        "--flip-rate",
+        type=float,
+        default=0.05,
+        help="share of users whose balance crosses the threshold",
+    )
+    parser.add_argument(
+        "--rate-limit-pause",
+        type=float,
+        default=0,
+        help="pause every 99 lookups, 1s in production",
+    )
+    parser.add_argument("--dispatch", action="store_true", help="also drain the outbox")
+    parser.add_argument(
+        "--memory", action="store_true", help="trace Python allocations (slow)"
+    )
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args()
+
+
+def configure(args: argparse.Namespace) -> None:
+    if "bench" not in args.db_name:
+        sys.exit("--db-name must name a dedicated benchmark database")
+    # settings are read on first use, override them before running anything
+    os.environ["DB_NAME"] = args.db_name
+    os.environ["SWEEP_RATE_LIMIT_PAUSE"] = str(args.rate_limit_pause)
+    os.environ["USER_CACHE_REDIS"] = "false"
+    os.environ["METRICS_PORT"] = "0"
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+
+def install_app(session, provider, price_latency: float):
+    """
+    Builds the bot around the fakes and installs it as the application the
+    sweep takes its dependencies from.
+    """
+    from aiogram import Bot
+
+    from benchmarks.fakes import FakeDeDustHelper
+    from bot.middlewares.tracing import Tracer
+    from bot.middlewares.util_middleware import TonApiHelper
+    from bot.prepare import App, set_app
+
+    app = App()
+    # components the sweep would otherwise build against the network
+    app.bot = Bot("1:bench", session=session)
+    app.breakers = []
+    app.tracer = Tracer(sample_rate=0)
+    app.ton_api_helper = TonApiHelper(providers=[provider])
+    app.dedust_helper = FakeDeDustHelper(uow=app.uow, latency=price_latency)
+    set_app(app)
+    return app
+
+
+async def seed(users: int, flip_rate: float, rng: random.Random) -> dict[str, int]:
+    """
+    Recreates the tables with synthetic users.
+
+    :return: Wallet -> on-chain balance to be served by the fake provider.
+    """
+    from sqlalchemy import insert
+
+    from benchmarks.fakes import fake_wallet
+    from bot.config import settings
+    from bot.db.db import Base, get_engine
+    from bot.db.models.model_history import (  # noqa: F401
+        HistoryDailyORM,
+        HistoryORM,
+    )
+    from bot.db.models.model_outbox import OutboxORM  # noqa: F401
+    from bot.db.models.model_prices import PricesORM  # noqa: F401
+    from bot.db.models.model_stats import STATS_VIEWS  # noqa: F401
+    from bot.db.models.model_sweeps import SweepsORM  # noqa: F401
+    from bot.db.models.model_users import UsersORM
+    from bot.db.services.service_history import HistoryService
+    from bot.db.utils.unitofwork import UnitOfWork
+
+    rows = []
+    balances = {}
+    for i in range(1, users + 1):
+        og = rng.random() < 0.1
+        threshold = settings.OG_THRESHOLD_BALANCE if og else settings.THRESHOLD_BALANCE
+        banned = rng.random() < 0.1
+        if banned:
+            stored = rng.randint(0, max(threshold - 1, 0))
+        else:
+            stored = rng.randint(threshold, threshold * 10)
+
+        roll = rng.random()
+        if roll < flip_rate:
+            # crosses the threshold: ban or unban
+            actual = threshold * 2 if banned else max(threshold - 1, 0)
+        elif roll < flip_rate * 3:
+            # buy or sell without crossing it
+            actual = stored + rng.randint(1, 100)
+        else:
+            actual = stored
+
+        wallet = fake_wallet(i)
+        balances[wallet] = actual
+        rows.append(
+            {
+                "username": f"bench{i}",
+                "tg_user_id": 10**9 + i,
+                "balance": stored,
+                "entry_balance": stored,
+                "banned": banned,
+                "og": og,
+                "wallet": wallet,
+            }
+        )
+
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        for i in range(0, len(rows), 10_000):
+            await conn.execute(insert(UsersORM), rows[i : i + 10_000])
+    await HistoryService().maintain_partitions(
+        uow=UnitOfWork(), months_ahead=1, retention_months=1
+    )
+    return balances
+
+
+async def run(args: argparse.Namespace, users: int, app, provider, session):
+    from sqlalchemy import event, func, select
+
+    from bot.db.db import get_engine, get_session_maker
+    from bot.db.models.model_outbox import OutboxORM
+    from bot.db.models.model_sweeps import SweepsORM
+    from bot.tasks import task_dispatch_outbox, task_update_users
+
+    rng = random.Random(args.seed)
+    provider.balances = await seed(users, args.flip_rate, rng)
+    provider.calls.clear()
+    session.calls.clear()
+    app.flip_guard.pending.clear()
+    app.flip_guard.held.clear()
+    app.dedust_helper.calls = 0
+
+    commits = 0
+
+    def on_commit(conn):
+        nonlocal commits
+        commits += 1
+
+    event.listen(get_engine().sync_engine, "commit", on_commit)
+    if args.memory:
+        tracemalloc.start()
+
+    started = time.perf_counter()
+    await task_update_users()
+    sweep_time = time.perf_counter() - started
+    sweep_commits = commits
+
+    dispatch_time = None
+    if args.dispatch:
+        started = time.perf_counter()
+        await task_dispatch_outbox()
+        dispatch_time = time.perf_counter() - started
+
+    memory_peak = None
+    if args.memory:
+        memory_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    event.remove(get_engine().sync_engine, "commit", on_commit)
+
+    async with get_session_maker()() as db:
+        sweep = (await db.execute(select(SweepsORM))).scalar_one()
+        outbox = (await db.execute(select(func.count(OutboxORM.id)))).scalar_one()
+
+    provider_calls = sum(provider.calls.values())
+    return {
+        "users": users,
+        "finished": sweep.finished,
+        "sweep_time": round(sweep_time, 3),
+        "users_per_second": round(users / sweep_time, 1),
+        "provider_calls_per_user": round(provider_calls / users, 3),
+        "provider_failures": provider.calls["error"] + provider.calls["rate_limited"],
+        "price_calls": app.dedust_helper.calls,
+        "users_processed": sweep.users_processed,
+        "users_skipped": sweep.users_skipped,
+        "outbox_entries": outbox,
+        "sweep_db_commits": sweep_commits,
+        "dispatch_time": dispatch_time and round(dispatch_time, 3),
+        "telegram_calls": sum(session.calls.values()),
+        "telegram_calls_by_method": dict(session.calls),
+        "memory_peak_mb": memory_peak and round(memory_peak / 2**20, 1),
+        "max_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    from benchmarks.fakes import FakeBalanceProvider, RecordingSession
+
+    session = RecordingSession(latency=args.telegram_latency)
+    provider = FakeBalanceProvider(
+        balances={},
+        delay=args.latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    )
+    app = install_app(session, provider, args.price_latency)
+
+    results = []
+    for users in args.users:
+        result = await run(args, users, app, provider, session)
+        results.append(result)
+        print(
+            f"{result['users']:>7} users: {result['sweep_time']:>9.3f}s "
+            f"({result['users_per_second']} users/s), "
+            f"{result['provider_calls_per_user']} lookups/user, "
+            f"{result['sweep_db_commits']} commits, "
+            f"{result['outbox_entries']} outbox entries, "
+            f"{result['telegram_calls']} telegram calls, "
+            f"max RSS {result['max_rss_mb']} MB"
+            + (
+                f", peak {result['memory_peak_mb']} MB"
+                if result["memory_peak_mb"] is not None
+                else ""
+            )
+        )
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure(arguments)
+    asyncio.run(main(arguments))
@@ -1,5 +1,9 @@
 import asyncio
 import logging
+import sys
+import time
+from datetime import datetime
+from typing import Awaitable
 from aiogram import Dispatcher
 from aiogram.exceptions import (
     TelegramAPIError,
@@ -13,12 +17,33 @@ from aiogram_tonconnect.utils.qrcode import QRUrlProvider
 from aiohttp.client_exceptions import ClientPayloadError
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from redis.asyncio import Redis
 
-from bot.middlewares.throttling import ThrottlingMiddleware
-from bot.handlers import router
+from bot.middlewares.tracing import TracingMiddleware
+from bot.middlewares.throttling import (
+    MemoryThrottlingBackend,
+    RedisThrottlingBackend,
+    ThrottlingMiddleware,
+)
+from bot.handlers import admin_router, router
 from bot.config import settings
-from bot.prepare import bot, util_middleware, EXCLUDE_WALLETS
-from bot.tasks import task_update_users
+from bot.db.db import get_pool_status, warm_up_pool
+from bot.prepare import App, EXCLUDE_WALLETS, get_app, setup_logging
+from bot.tasks import (
+    print_sweep_plan,
+    task_dispatch_outbox,
+    task_maintain_history,
+    task_reap_invite_links,
+    task_update_users,
+)
+from bot.utils.metrics import (
+    READY,
+    WARMUP_DURATION,
+    monitor_event_loop_lag,
+    start_metrics_server,
+    track_breakers,
+    track_db_pool,
+)
 
 
 def exception_handler(loop, context):
@@ -31,12 +56,84 @@ def exception_handler(loop, context):
         )
 
 
-async def start_bot():
+async def warm_up_step(name: str, aw: Awaitable) -> None:
+    started = time.monotonic()
+    try:
+        await aw
+    except Exception as e:
+        logging.error("Warm-up of %s failed: %s", name, e)
+    finally:
+        WARMUP_DURATION.labels(name).set(time.monotonic() - started)
+
+
+async def warm_up(app: App, ready: asyncio.Event):
+    """
+    Opens the connections the first connects and the first sweep would
+    otherwise pay for and primes the price cache, all concurrently.
+
+    Sets ready once done or after WARMUP_TIMEOUT, whatever comes first;
+    steps still running then are left to finish in the background.
+    """
+    started = time.monotonic()
+    # building the balancer downloads its config synchronously, keep it off
+    # the event loop and inside the timeout
+    lite_balancer = asyncio.create_task(asyncio.to_thread(lambda: app.lite_balancer))
+
+    async def warm_up_balances():
+        await asyncio.shield(lite_balancer)
+        await app.ton_api_helper.warm_up()
+
+    async def warm_up_price():
+        await asyncio.shield(lite_balancer)
+        # also connects the liteservers and looks up the DeDust pool
+        await app.dedust_helper.get_price_sample(settings.WON_ADDR)
+
+    steps = {
+        "database": warm_up_pool(settings.DB_POOL_SIZE),
+        "telegram": app.bot.get_me(),
+        "balances": warm_up_balances(),
+        "price": warm_up_price(),
+    }
+    tasks = {
+        asyncio.create_task(warm_up_step(name, aw)): name for name, aw in steps.items()
+    }
+    _, pending = await asyncio.wait(tasks, timeout=settings.WARMUP_TIMEOUT)
+    duration = time.monotonic() - started
+    WARMUP_DURATION.labels("total").set(duration)
+    if pending:
+        logging.error(
+            "Warm-up timed out after %.1fs, still running: %s",
+            duration,
+            ", ".join(tasks[task] for task in pending),
+        )
+    print(f"-----WARM-UP DONE IN {duration:.1f}s-----")
+    READY.set(1)
+    ready.set()
+    # keep the pending steps referenced until they finish
+    await asyncio.gather(*pending)
+
+
+async def start_bot(app: App, ready: asyncio.Event):
+    # updates wait on Telegram's side until the bot is warm, the components
+    # are only built once the warm-up had its chance to build them
+    await ready.wait()
     storage = MemoryStorage()
     dp = Dispatcher(storage=storage)
+    # outermost, so that the other middlewares are timed too
+    dp.update.outer_middleware.register(TracingMiddleware(app.tracer))
 
-    dp.update.middleware.register(ThrottlingMiddleware())
-    dp.update.middleware.register(util_middleware)
+    if settings.THROTTLING_REDIS:
+        throttling_backend = RedisThrottlingBackend(
+            redis=Redis.from_url(settings.REDIS_DSN)
+        )
+    else:
+        throttling_backend = MemoryThrottlingBackend()
+    throttling_middleware = ThrottlingMiddleware(
+        backend=throttling_backend, connect=settings.CONNECT_THROTTLING_TTL
+    )
+    dp.message.middleware.register(throttling_middleware)
+    dp.callback_query.middleware.register(throttling_middleware)
+    dp.update.middleware.register(app.util_middleware)
     dp.update.middleware.register(
         AiogramTonConnectMiddleware(
             storage=ATCMemoryStorage(),
@@ -49,28 +146,115 @@ async def start_bot():
     AiogramTonConnectHandlers().register(dp)
 
     dp.include_router(router)
+    dp.include_router(admin_router)
 
-    await dp.start_polling(bot)
+    await dp.start_polling(app.bot)
 
 
-async def start_scheduler():
+async def start_scheduler(app: App, ready: asyncio.Event, worker: bool = True):
+    """
+    Schedules the background jobs.
+
+    :param worker: Whether to run the sweep and the other worker jobs, the
+        invite pool is refilled in every process since both connects and
+        queued unbans take links from it.
+    """
+    # before adding the jobs, those due now would be missed otherwise
+    await ready.wait()
     scheduler = AsyncIOScheduler()
+    scheduler.add_job(
+        app.invite_pool.refill,
+        trigger="interval",
+        seconds=settings.INVITE_POOL_REFILL_INTERVAL,
+        next_run_time=datetime.now(),
+    )
+    if not worker:
+        scheduler.start()
+        return
+
     scheduler.add_job(
         task_update_users, trigger="interval", seconds=settings.REFRESH_TIMEOUT
     )
+    scheduler.add_job(
+        task_dispatch_outbox,
+        trigger="interval",
+        seconds=settings.OUTBOX_DISPATCH_INTERVAL,
+    )
+    scheduler.add_job(
+        task_maintain_history,
+        trigger="interval",
+        hours=24,
+        next_run_time=datetime.now(),
+    )
+    scheduler.add_job(
+        task_reap_invite_links,
+        trigger="interval",
+        seconds=settings.INVITE_REAPER_INTERVAL,
+    )
     scheduler.start()
 
 
-async def main():
-    await asyncio.gather(start_bot(), start_scheduler())
+async def start_metrics(app: App):
+    if not settings.METRICS_PORT:
+        return
+    try:
+        await start_metrics_server(settings.METRICS_PORT, settings.METRICS_HOST)
+    except OSError as e:
+        # e.g. the port is taken by another replica, the bot runs without it
+        logging.error(
+            "Metrics server on %s:%s failed to start: %s",
+            settings.METRICS_HOST,
+            settings.METRICS_PORT,
+            e,
+        )
+        return
+    track_db_pool(get_pool_status)
+    track_breakers(app.breakers)
+    await monitor_event_loop_lag()
+
+
+async def main(polling: bool = True, worker: bool = True):
+    """
+    Runs the bot.
+
+    :param polling: Whether to handle updates.
+    :param worker: Whether to run the sweep and the other scheduled jobs.
+    """
+    if polling != worker and not settings.USER_CACHE_REDIS:
+        # an in-memory cache would keep serving users the other process
+        # banned, unbanned or gave new invite links
+        raise RuntimeError("--bot and --worker require USER_CACHE_REDIS")
+
+    app = get_app()
+    ready = asyncio.Event()
+    coros = [
+        start_metrics(app),
+        warm_up(app, ready),
+        start_scheduler(app, ready, worker=worker),
+    ]
+    if polling:
+        coros.append(start_bot(app, ready))
+    else:
+        # the scheduler runs in the background, keep the process alive
+        coros.append(asyncio.Event().wait())
+    await asyncio.gather(*coros)
 
 
 if __name__ == "__main__" or __name__ == "bot.__main__":
     loop = asyncio.new_event_loop()
     # loop.set_exception_handler(exception_handler)
     asyncio.set_event_loop(loop)
+    setup_logging()
     try:
-        loop.run_until_complete(main())
+        if "--dry-run" in sys.argv:
+            # print what the next sweep would do and exit
+            loop.run_until_complete(print_sweep_plan())
+        else:
+            print("-----BOT STARTED-----")
+            # --bot only handles updates, --worker only runs the scheduled jobs
+            loop.run_until_complete(
+                main(polling="--worker" not in sys.argv, worker="--bot" not in sys.argv)
+            )
     except ConnectionError:
         pass
     except ClientPayloadError:
@@ -1,12 +1,13 @@
+import functools
 import sys
+from typing import cast
+
 from pydantic_settings import BaseSettings
 from dotenv import find_dotenv, load_dotenv
 
 # Check if we're in debug mode
 env_file = ".env.debug" if "dev_environment" in sys.argv else ".env"
 
-load_dotenv(find_dotenv(env_file))
-
 
 class Settings(BaseSettings):
     DB_HOST: str
@@ -14,6 +15,13 @@ class Settings(BaseSettings):
     DB_USER: str
     DB_PASS: str
     DB_NAME: str
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_COMMAND_TIMEOUT: float = 60
+    DB_STATEMENT_CACHE_SIZE: int = 100
 
     WON_ADDR: str
     WON_LP_ADDR: str
@@ -27,10 +35,67 @@ class Settings(BaseSettings):
     BOT_TOKEN: str
     REDIS_DSN: str
     TON_API_KEY: str
+    TONCENTER_API_KEY: str = ""
+    TONCENTER_URL: str = "https://toncenter.com/api/v3"
 
     REFRESH_TIMEOUT: int
+    BALANCE_CACHE_TTL: float = 30
+    # balance providers by priority: tonapi, toncenter, liteserver; hedging and
+    # cross-checks need a second one, keyless toncenter is heavily rate-limited
+    BALANCE_PROVIDERS: list[str] = ["tonapi"]
+    BALANCE_HEDGE_DELAY: float = 1
+    BALANCE_MIN_HEDGE_DELAY: float = 0.2
+    BALANCE_CROSS_CHECK_RATE: float = 0.01
+    JETTON_DECIMALS: int = 9
+    # seconds to wait for the liteserver config download
+    LITESERVER_CONFIG_TIMEOUT: float = 10
+    # seconds a DeDust price sample is reused before it is refreshed
+    PRICE_CACHE_TTL: float = 60
+    CONNECT_STEP_TIMEOUT: float = 10
+    CONNECT_DEADLINE: float = 15
+    CONNECT_LOCK_REDIS: bool = False
+    CONNECT_LOCK_TTL: int = 60
+    CONNECT_THROTTLING_TTL: float = 3
+    # refuse to connect a wallet already connected by another account
+    BLOCK_SHARED_WALLETS: bool = False
+    THROTTLING_REDIS: bool = False
+    INVITE_POOL_SIZE: int = 20
+    INVITE_POOL_REFILL_INTERVAL: int = 60
+    INVITE_LINK_TTL: int = 86400
+    INVITE_LINK_MIN_TTL: int = 43200
+    INVITE_REAPER_INTERVAL: int = 600
+    INVITE_REAPER_BATCH_SIZE: int = 20
+    OUTBOX_DISPATCH_INTERVAL: int = 5
+    OUTBOX_BATCH_SIZE: int = 50
+    OUTBOX_LEASE: int = 120
+    OUTBOX_MAX_ATTEMPTS: int = 5
+    OUTBOX_RETRY_DELAY: float = 30
+    HYSTERESIS_BAND: int = 0
+    FLIP_CONFIRMATIONS: int = 1
+    SWEEP_CHECKPOINT_INTERVAL: int = 99
+    SWEEP_RATE_LIMIT_PAUSE: float = 1
+    HISTORY_PARTITIONS_AHEAD: int = 2
+    # months of history kept in partitions, 0 keeps it forever
+    HISTORY_RETENTION_MONTHS: int = 0
+    # detach expired history partitions as history_archive_* tables instead of dropping them
+    HISTORY_ARCHIVE: bool = True
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RECOVERY_TIMEOUT: float = 30
+    USER_CACHE_TTL: int = 300
+    # required when updates and the worker run as separate processes
+    USER_CACHE_REDIS: bool = False
 
     MANIFEST_URL: str
+    # /metrics is unauthenticated, 0 disables it
+    METRICS_PORT: int = 0
+    # address /metrics listens on, e.g. 0.0.0.0 behind a firewall
+    METRICS_HOST: str = "127.0.0.1"
+    # share of updates and connect flows within the budget logged with their spans
+    TRACE_SAMPLE_RATE: float = 0.05
+    # updates and connect flows slower than this many seconds are logged
+    SLOW_UPDATE_BUDGET: float = 3
+    # seconds to wait for the startup warm-up before taking updates anyway
+    WARMUP_TIMEOUT: float = 20
 
     class Config:
         env_file = env_file
@@ -45,4 +110,19 @@ class Settings(BaseSettings):
         return f"postgresql+psycopg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
 
-settings = Settings()
+@functools.cache
+def get_settings() -> Settings:
+    """Reads the settings from the environment on first use."""
+    load_dotenv(find_dotenv(env_file))
+    return Settings()
+
+
+class _LazySettings:
+    """Proxy reading the settings only once an attribute is accessed."""
+
+    def __getattr__(self, name: str):
+        return getattr(get_settings(), name)
+
+
+# importing modules that use the settings doesn't require the environment
+settings = cast(Settings, _LazySettings())
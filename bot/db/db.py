@@ -1,10 +1,104 @@
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+import asyncio
+import functools
+import time
+
+from sqlalchemy import exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from bot.config import settings
 
-async_engine = create_async_engine(url=settings.DATABASE_URL_asyncpg)
-async_session_maker = async_sessionmaker(async_engine, expire_on_commit=False)
+
+class PoolStats:
+    """Counters of connection checkouts from the engine pool."""
+
+    def __init__(self) -> None:
+        self.waiting = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def observe_wait(self, wait_time: float) -> None:
+        self.checkouts += 1
+        self.wait_time_total += wait_time
+        self.wait_time_max = max(self.wait_time_max, wait_time)
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool recording how long callers wait for a connection."""
+
+    def connect(self):
+        pool_stats.waiting += 1
+        started = time.monotonic()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        finally:
+            pool_stats.waiting -= 1
+            pool_stats.observe_wait(time.monotonic() - started)
+
+
+def get_pool_status() -> dict:
+    pool = get_engine().pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "waiting": pool_stats.waiting,
+        "checkouts": pool_stats.checkouts,
+        "timeouts": pool_stats.timeouts,
+        "wait_time_avg": pool_stats.wait_time_total / max(pool_stats.checkouts, 1),
+        "wait_time_max": pool_stats.wait_time_max,
+    }
+
+
+@functools.cache
+def get_engine() -> AsyncEngine:
+    """Creates the engine on first use, importing models doesn't need the database."""
+    return create_async_engine(
+        # SQLAlchemy keeps its own prepared statement cache on top of asyncpg's
+        url=make_url(settings.DATABASE_URL_asyncpg).update_query_dict(
+            {"prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)}
+        ),
+        poolclass=InstrumentedPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            "command_timeout": settings.DB_COMMAND_TIMEOUT,
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        },
+    )
+
+
+async def warm_up_pool(connections: int) -> None:
+    """Opens the given number of pool connections ahead of the first transactions."""
+
+    async def ping() -> None:
+        async with get_engine().connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    # held concurrently, so each ping opens its own connection
+    await asyncio.gather(*(ping() for _ in range(connections)))
+
+
+@functools.cache
+def get_session_maker() -> async_sessionmaker:
+    return async_sessionmaker(get_engine(), expire_on_commit=False)
 
 
 class Base(DeclarativeBase):
@@ -22,5 +116,5 @@ class Base(DeclarativeBase):
 
 
 async def get_async_session():
-    async with async_session_maker() as session:
+    async with get_session_maker()() as session:
         yield session
@@ -11,7 +11,10 @@ from bot.config import settings
 
 from bot.db.db import Base
 from bot.db.models.model_users import UsersORM
-from bot.db.models.model_history import HistoryORM
+from bot.db.models.model_history import HistoryDailyORM, HistoryORM
+from bot.db.models.model_sweeps import SweepsORM
+from bot.db.models.model_outbox import OutboxORM
+from bot.db.models.model_prices import PricesORM
 
 config = context.config
 
@@ -25,6 +28,13 @@ config.set_main_option(
 target_metadata = Base.metadata
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # history partitions and archives are managed at runtime, not by migrations
+    if type_ == "table" and reflected and name.startswith("history_"):
+        return name in target_metadata.tables
+    return True
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -43,6 +53,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -54,6 +65,7 @@ def do_run_migrations(connection: Connection) -> None:
         connection=connection,
         target_metadata=target_metadata,
         compare_server_default=True,
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -0,0 +1,96 @@
+"""stats from daily rollups
+
+Revision ID: 1f7c4d8e2b96
+Revises: e6b3f90a2c45
+Create Date: 2026-10-20 12:31:47.208513
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "1f7c4d8e2b96"
+down_revision = "e6b3f90a2c45"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # today's buys and sells are summed from history_daily
+    op.execute("DROP MATERIALIZED VIEW stats_summary")
+    op.execute("""
+        CREATE MATERIALIZED VIEW stats_summary AS
+        SELECT
+            1 AS id,
+            members.*,
+            activity.*,
+            flips.*,
+            now() AS refreshed_at
+        FROM (
+            SELECT
+                count(*) FILTER (WHERE NOT banned AND NOT blacklisted) AS members,
+                count(*) FILTER (WHERE og AND NOT banned AND NOT blacklisted) AS og,
+                count(*) FILTER (WHERE banned) AS banned,
+                count(*) FILTER (WHERE blacklisted) AS blacklisted,
+                coalesce(sum(balance) FILTER (WHERE NOT banned AND NOT blacklisted), 0)
+                    AS balance
+            FROM users
+        ) members, (
+            -- volume +/- net_delta is twice what a user bought/sold that day
+            SELECT
+                coalesce(sum(volume + net_delta) / 2, 0)::bigint AS bought,
+                coalesce(sum(volume - net_delta) / 2, 0)::bigint AS sold,
+                count(*) FILTER (WHERE volume + net_delta > 0) AS buyers,
+                count(*) FILTER (WHERE volume - net_delta > 0) AS sellers
+            FROM history_daily
+            WHERE day = current_date
+        ) activity, (
+            SELECT
+                count(*) FILTER (WHERE action = 'ban') AS bans,
+                count(*) FILTER (WHERE action = 'unban') AS unbans
+            FROM history
+            WHERE created_at >= current_date AND action IS NOT NULL
+        ) flips
+        """)
+    op.execute("CREATE UNIQUE INDEX ix_stats_summary_id ON stats_summary (id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP MATERIALIZED VIEW stats_summary")
+    op.execute("""
+        CREATE MATERIALIZED VIEW stats_summary AS
+        SELECT
+            1 AS id,
+            members.*,
+            activity.*,
+            flips.*,
+            now() AS refreshed_at
+        FROM (
+            SELECT
+                count(*) FILTER (WHERE NOT banned AND NOT blacklisted) AS members,
+                count(*) FILTER (WHERE og AND NOT banned AND NOT blacklisted) AS og,
+                count(*) FILTER (WHERE banned) AS banned,
+                count(*) FILTER (WHERE blacklisted) AS blacklisted,
+                coalesce(sum(balance) FILTER (WHERE NOT banned AND NOT blacklisted), 0)
+                    AS balance
+            FROM users
+        ) members, (
+            SELECT
+                coalesce(sum(balance_delta) FILTER (WHERE balance_delta > 0), 0)
+                    AS bought,
+                coalesce(-sum(balance_delta) FILTER (WHERE balance_delta < 0), 0)
+                    AS sold,
+                count(DISTINCT user_id) FILTER (WHERE balance_delta > 0) AS buyers,
+                count(DISTINCT user_id) FILTER (WHERE balance_delta < 0) AS sellers
+            FROM history
+            WHERE created_at >= now() - interval '24 hours'
+        ) activity, (
+            SELECT
+                count(*) FILTER (WHERE action = 'ban') AS bans,
+                count(*) FILTER (WHERE action = 'unban') AS unbans
+            FROM history
+            WHERE created_at >= now() - interval '24 hours' AND action IS NOT NULL
+        ) flips
+        """)
+    op.execute("CREATE UNIQUE INDEX ix_stats_summary_id ON stats_summary (id)")
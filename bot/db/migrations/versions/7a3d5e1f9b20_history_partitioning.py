@@ -0,0 +1,137 @@
+"""history partitioning
+
+Revision ID: 7a3d5e1f9b20
+Revises: 0c6e2b9f8a14
+Create Date: 2026-10-19 18:42:51.318604
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "7a3d5e1f9b20"
+down_revision = "0c6e2b9f8a14"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # history becomes partitioned by month, the existing rows are copied over
+    op.execute("ALTER TABLE history RENAME TO history_old")
+    op.execute("ALTER INDEX history_pkey RENAME TO history_old_pkey")
+    op.execute("""
+        CREATE TABLE history (
+            id INTEGER NOT NULL DEFAULT nextval('history_id_seq'),
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            balance_delta INTEGER NOT NULL,
+            volume INTEGER,
+            price FLOAT NOT NULL,
+            wallet VARCHAR,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """)
+    op.execute("ALTER SEQUENCE history_id_seq OWNED BY history.id")
+    # partitions from the oldest entry up to two months ahead, the bot keeps
+    # creating the upcoming ones
+    op.execute("""
+        DO $$
+        DECLARE
+            month DATE := date_trunc(
+                'month', COALESCE((SELECT min(created_at) FROM history_old), now())
+            );
+        BEGIN
+            WHILE month < date_trunc('month', now()) + INTERVAL '3 months' LOOP
+                EXECUTE format(
+                    'CREATE TABLE history_y%sm%s PARTITION OF history '
+                    'FOR VALUES FROM (%L) TO (%L)',
+                    to_char(month, 'YYYY'),
+                    to_char(month, 'MM'),
+                    month,
+                    month + INTERVAL '1 month'
+                );
+                month := month + INTERVAL '1 month';
+            END LOOP;
+        END $$
+        """)
+    op.execute(
+        "INSERT INTO history "
+        "(id, user_id, balance_delta, volume, price, wallet, created_at, updated_at) "
+        "SELECT id, user_id, balance_delta, volume, price, wallet, created_at, updated_at "
+        "FROM history_old"
+    )
+    op.drop_table("history_old")
+    op.create_index(
+        "ix_history_user_id_created_at",
+        "history",
+        ["user_id", "created_at"],
+        unique=False,
+    )
+
+    op.create_table(
+        "history_daily",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("net_delta", sa.BigInteger(), nullable=False),
+        sa.Column("volume", sa.BigInteger(), nullable=False),
+        sa.Column("min_balance", sa.BigInteger(), nullable=False),
+        sa.Column("max_balance", sa.BigInteger(), nullable=False),
+        sa.Column("changes", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "day"),
+    )
+    op.create_index("ix_history_daily_day", "history_daily", ["day"], unique=False)
+    # backfill the rollups, the balance after each entry is the current
+    # balance minus all later deltas
+    op.execute("""
+        INSERT INTO history_daily
+            (user_id, day, net_delta, volume, min_balance, max_balance, changes, updated_at)
+        SELECT user_id, created_at::date, sum(balance_delta), sum(abs(balance_delta)),
+               min(balance_after), max(balance_after), count(*), now()
+        FROM (
+            SELECT h.user_id, h.created_at, h.balance_delta,
+                   u.balance - sum(h.balance_delta) OVER (
+                       PARTITION BY h.user_id ORDER BY h.created_at DESC, h.id DESC
+                   ) + h.balance_delta AS balance_after
+            FROM history h JOIN users u ON u.id = h.user_id
+        ) entries
+        GROUP BY user_id, created_at::date
+        """)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_history_daily_day", table_name="history_daily")
+    op.drop_table("history_daily")
+
+    op.execute("ALTER TABLE history RENAME TO history_partitioned")
+    op.execute("ALTER INDEX history_pkey RENAME TO history_partitioned_pkey")
+    op.create_table(
+        "history",
+        sa.Column(
+            "id",
+            sa.Integer(),
+            server_default=sa.text("nextval('history_id_seq')"),
+            nullable=False,
+        ),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("balance_delta", sa.Integer(), nullable=False),
+        sa.Column("volume", sa.Integer(), nullable=True),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("wallet", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.execute("ALTER SEQUENCE history_id_seq OWNED BY history.id")
+    op.execute(
+        "INSERT INTO history "
+        "(id, user_id, balance_delta, volume, price, wallet, created_at, updated_at) "
+        "SELECT id, user_id, balance_delta, volume, price, wallet, created_at, updated_at "
+        "FROM history_partitioned"
+    )
+    # drops the partitions as well
+    op.execute("DROP TABLE history_partitioned")
@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, Boolean, ForeignKey
+from sqlalchemy import BigInteger, Boolean, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from bot.db.db import Base
@@ -7,17 +7,50 @@ from bot.db.models._common import *
 
 class HistoryORM(Base):
     __tablename__ = "history"
+    # monthly partitions are created and retired by HistoryService
+    __table_args__ = (
+        Index("ix_history_user_id_created_at", "user_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
-    id: Mapped[intpk]
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     balance_delta: Mapped[int]
     volume: Mapped[Optional[int]]
-    price: Mapped[float]
+    # rows written before the prices table keep their price inline
+    price: Mapped[Optional[float]]
+    price_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("prices.id", ondelete="SET NULL")
+    )
     wallet: Mapped[Optional[str]]
+    # ban or unban recorded by the entry, None for plain balance changes
+    action: Mapped[Optional[str]]
 
     user: Mapped["UsersORM"] = relationship(
         back_populates="history",
     )
 
-    created_at: Mapped[created_at]
+    # part of the primary key since it is the partition key
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        primary_key=True, default=func.now()
+    )
+    updated_at: Mapped[updated_at]
+
+
+class HistoryDailyORM(Base):
+    """Per-user daily rollup of history, updated with every history entry."""
+
+    __tablename__ = "history_daily"
+    __table_args__ = (Index("ix_history_daily_day", "day"),)
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    day: Mapped[datetime.date] = mapped_column(primary_key=True)
+    net_delta: Mapped[int] = mapped_column(BigInteger)
+    volume: Mapped[int] = mapped_column(BigInteger)
+    min_balance: Mapped[int] = mapped_column(BigInteger)
+    max_balance: Mapped[int] = mapped_column(BigInteger)
+    changes: Mapped[int]
+
     updated_at: Mapped[updated_at]
@@ -0,0 +1,21 @@
+from sqlalchemy import JSON, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from bot.db.db import Base
+from bot.db.models._common import *
+
+
+class OutboxORM(Base):
+    __tablename__ = "outbox"
+
+    id: Mapped[intpk]
+    key: Mapped[str] = mapped_column(unique=True)
+    action: Mapped[str]
+    payload: Mapped[dict] = mapped_column(JSON)
+    status: Mapped[str] = mapped_column(default="pending", index=True)
+    attempts: Mapped[int] = mapped_column(default=0)
+    next_attempt_at: Mapped[datetime.datetime] = mapped_column(default=func.now())
+    last_error: Mapped[Optional[str]]
+
+    created_at: Mapped[created_at]
+    updated_at: Mapped[updated_at]
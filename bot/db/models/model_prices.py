@@ -0,0 +1,19 @@
+from sqlalchemy import Index
+from sqlalchemy.orm import Mapped
+
+from bot.db.db import Base
+from bot.db.models._common import *
+
+
+class PricesORM(Base):
+    """Jetton price samples, one per price refresh."""
+
+    __tablename__ = "prices"
+    __table_args__ = (Index("ix_prices_jetton_created_at", "jetton", "created_at"),)
+
+    id: Mapped[intpk]
+    jetton: Mapped[str]
+    # TON per jetton
+    price: Mapped[float]
+
+    created_at: Mapped[created_at]
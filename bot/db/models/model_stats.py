@@ -0,0 +1,101 @@
+from sqlalchemy import DDL, column, event, table
+
+from bot.db.db import Base
+
+# Admin statistics are precomputed into materialized views refreshed after
+# every sweep, so the admin commands never scan users or history. Today's
+# buys and sells come from the history_daily rollups.
+# Migrations create the views, the DDL below is for Base.metadata.create_all.
+
+HOLDERS_QUERY = """
+SELECT
+    CASE WHEN balance > 0
+        THEN power(10, length(balance::text) - 1)::bigint ELSE 0 END AS bucket,
+    count(*) AS holders,
+    count(*) FILTER (WHERE NOT banned) AS members,
+    coalesce(sum(balance), 0) AS balance
+FROM users
+WHERE NOT blacklisted
+GROUP BY 1
+"""
+
+SUMMARY_QUERY = """
+SELECT
+    1 AS id,
+    members.*,
+    activity.*,
+    flips.*,
+    now() AS refreshed_at
+FROM (
+    SELECT
+        count(*) FILTER (WHERE NOT banned AND NOT blacklisted) AS members,
+        count(*) FILTER (WHERE og AND NOT banned AND NOT blacklisted) AS og,
+        count(*) FILTER (WHERE banned) AS banned,
+        count(*) FILTER (WHERE blacklisted) AS blacklisted,
+        coalesce(sum(balance) FILTER (WHERE NOT banned AND NOT blacklisted), 0)
+            AS balance
+    FROM users
+) members, (
+    -- volume +/- net_delta is twice what a user bought/sold that day
+    SELECT
+        coalesce(sum(volume + net_delta) / 2, 0)::bigint AS bought,
+        coalesce(sum(volume - net_delta) / 2, 0)::bigint AS sold,
+        count(*) FILTER (WHERE volume + net_delta > 0) AS buyers,
+        count(*) FILTER (WHERE volume - net_delta > 0) AS sellers
+    FROM history_daily
+    WHERE day = current_date
+) activity, (
+    SELECT
+        count(*) FILTER (WHERE action = 'ban') AS bans,
+        count(*) FILTER (WHERE action = 'unban') AS unbans
+    FROM history
+    WHERE created_at >= current_date AND action IS NOT NULL
+) flips
+"""
+
+# view -> (query, column of the unique index needed by REFRESH ... CONCURRENTLY)
+STATS_VIEWS = {
+    "stats_holders": (HOLDERS_QUERY, "bucket"),
+    "stats_summary": (SUMMARY_QUERY, "id"),
+}
+
+stats_holders = table(
+    "stats_holders",
+    column("bucket"),
+    column("holders"),
+    column("members"),
+    column("balance"),
+)
+
+stats_summary = table(
+    "stats_summary",
+    column("members"),
+    column("og"),
+    column("banned"),
+    column("blacklisted"),
+    column("balance"),
+    column("bought"),
+    column("sold"),
+    column("buyers"),
+    column("sellers"),
+    column("bans"),
+    column("unbans"),
+    column("refreshed_at"),
+)
+
+for _name, (_query, _key) in STATS_VIEWS.items():
+    event.listen(
+        Base.metadata,
+        "after_create",
+        DDL(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {_name} AS {_query}"),
+    )
+    event.listen(
+        Base.metadata,
+        "after_create",
+        DDL(f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{_name}_{_key} ON {_name} ({_key})"),
+    )
+    event.listen(
+        Base.metadata,
+        "before_drop",
+        DDL(f"DROP MATERIALIZED VIEW IF EXISTS {_name}"),
+    )
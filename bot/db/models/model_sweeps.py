@@ -0,0 +1,24 @@
+from sqlalchemy import Boolean
+from sqlalchemy.orm import Mapped, mapped_column
+
+from bot.db.db import Base
+from bot.db.models._common import *
+
+
+class SweepsORM(Base):
+    __tablename__ = "sweeps"
+
+    id: Mapped[intpk]
+    finished: Mapped[bool] = mapped_column(Boolean, default=False)
+    last_user_id: Mapped[int] = mapped_column(default=0)
+    users_total: Mapped[int] = mapped_column(default=0)
+    users_processed: Mapped[int] = mapped_column(default=0)
+    users_skipped: Mapped[int] = mapped_column(default=0)
+    flips_suppressed: Mapped[int] = mapped_column(default=0)
+    bans: Mapped[int] = mapped_column(default=0)
+    unbans: Mapped[int] = mapped_column(default=0)
+    resumes: Mapped[int] = mapped_column(default=0)
+    finished_at: Mapped[Optional[datetime.datetime]]
+
+    created_at: Mapped[created_at]
+    updated_at: Mapped[updated_at]
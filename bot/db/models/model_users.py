@@ -17,8 +17,14 @@ class UsersORM(Base):
     banned: Mapped[bool] = mapped_column(Boolean, default=False)
     invite_link: Mapped[Optional[str]]
     channel_invite_link: Mapped[Optional[str]]
-    wallet: Mapped[str]
+    invite_link_created_at: Mapped[Optional[datetime.datetime]]
+    invite_link_expires_at: Mapped[Optional[datetime.datetime]]
+    channel_invite_link_created_at: Mapped[Optional[datetime.datetime]]
+    channel_invite_link_expires_at: Mapped[Optional[datetime.datetime]]
+    # several accounts may connect the same wallet
+    wallet: Mapped[str] = mapped_column(index=True)
     og: Mapped[bool] = mapped_column(Boolean, default=False)
+    checked_at: Mapped[Optional[datetime.datetime]]
 
     history: Mapped[list["HistoryORM"]] = relationship(
         back_populates="user",
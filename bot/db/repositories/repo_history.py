@@ -1,6 +1,112 @@
-from bot.db.models.model_history import HistoryORM
+import datetime
+import re
+from typing import Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from bot.db.models.model_history import HistoryDailyORM, HistoryORM
 from bot.db.utils.repository import SQLAlchemyRepository
 
+PARTITION_NAME = re.compile(r"^history_y(\d{4})m(\d{2})$")
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"history_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_month(name: str) -> Optional[datetime.date]:
+    match = PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    return datetime.date(int(match[1]), int(match[2]), 1)
+
+
+def next_month(month: datetime.date) -> datetime.date:
+    return (month.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
 
 class HistoryRepository(SQLAlchemyRepository):
     model = HistoryORM
+
+    async def find_partitions(self) -> list[str]:
+        stmt = text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = 'history' ORDER BY c.relname"
+        )
+        res = await self.session.execute(stmt)
+        return list(res.scalars().all())
+
+    async def create_partition(self, month: datetime.date):
+        """Creates the partition holding the given month, if it doesn't exist."""
+        await self.session.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} "
+                f"PARTITION OF history FOR VALUES "
+                f"FROM ('{month:%Y-%m-01}') TO ('{next_month(month):%Y-%m-01}')"
+            )
+        )
+
+    async def drop_partition(self, name: str):
+        await self.session.execute(text(f"DROP TABLE {name}"))
+
+    async def archive_partition(self, name: str):
+        """Detaches a partition and keeps it as a standalone history_archive_* table."""
+        await self.session.execute(text(f"ALTER TABLE history DETACH PARTITION {name}"))
+        await self.session.execute(
+            text(
+                f"ALTER TABLE {name} RENAME TO {name.replace('history', 'history_archive', 1)}"
+            )
+        )
+
+
+class HistoryDailyRepository(SQLAlchemyRepository):
+    model = HistoryDailyORM
+
+    async def add_change(self, user_id: int, balance_delta: int, balance: int):
+        """Folds a history entry into today's rollup of the user."""
+        stmt = insert(self.model).values(
+            user_id=user_id,
+            day=func.current_date(),
+            net_delta=balance_delta,
+            volume=abs(balance_delta),
+            min_balance=balance,
+            max_balance=balance,
+            changes=1,
+            updated_at=func.now(),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "day"],
+            set_={
+                "net_delta": self.model.net_delta + stmt.excluded.net_delta,
+                "volume": self.model.volume + stmt.excluded.volume,
+                "min_balance": func.least(
+                    self.model.min_balance, stmt.excluded.min_balance
+                ),
+                "max_balance": func.greatest(
+                    self.model.max_balance, stmt.excluded.max_balance
+                ),
+                "changes": self.model.changes + 1,
+                "updated_at": func.now(),
+            },
+        )
+        await self.session.execute(stmt)
+
+    async def find_totals(self, since: datetime.date):
+        """Sums the rollups of all users per day."""
+        stmt = (
+            select(
+                self.model.day,
+                func.sum(self.model.net_delta).label("net_delta"),
+                func.sum(self.model.volume).label("volume"),
+                func.count().label("users"),
+                func.sum(self.model.changes).label("changes"),
+            )
+            .where(self.model.day >= since)
+            .group_by(self.model.day)
+            .order_by(self.model.day)
+        )
+        res = await self.session.execute(stmt)
+        return res.all()
@@ -0,0 +1,54 @@
+import datetime
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from bot.db.models.model_outbox import OutboxORM
+from bot.db.utils.repository import SQLAlchemyRepository
+
+
+class OutboxRepository(SQLAlchemyRepository):
+    model = OutboxORM
+
+    async def add_many(self, data: list[dict]):
+        """Inserts entries, skipping the ones whose idempotency key already exists."""
+        stmt = (
+            insert(self.model)
+            .values(data)
+            .on_conflict_do_nothing(index_elements=["key"])
+        )
+        await self.session.execute(stmt)
+
+    async def claim_due(self, limit: int, lease: int):
+        """Locks due entries and postpones them by lease seconds while they are handled."""
+        stmt = (
+            select(self.model)
+            .where(
+                self.model.status == "pending",
+                self.model.next_attempt_at <= func.now(),
+            )
+            .order_by(self.model.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        res = await self.session.execute(stmt)
+        entries = res.scalars().all()
+        if entries:
+            stmt = (
+                update(self.model)
+                .where(self.model.id.in_([entry.id for entry in entries]))
+                .values(next_attempt_at=func.now() + datetime.timedelta(seconds=lease))
+                .execution_options(synchronize_session=False)
+            )
+            await self.session.execute(stmt)
+        return entries
+
+    async def retry_later(self, id: int, delay: float, data: dict):
+        stmt = (
+            update(self.model)
+            .filter_by(id=id)
+            .values(
+                next_attempt_at=func.now() + datetime.timedelta(seconds=delay), **data
+            )
+        )
+        await self.session.execute(stmt)
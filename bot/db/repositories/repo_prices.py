@@ -0,0 +1,43 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import insert, select
+
+from bot.db.models.model_prices import PricesORM
+from bot.db.utils.repository import SQLAlchemyRepository
+
+
+class PricesRepository(SQLAlchemyRepository):
+    model = PricesORM
+
+    async def add_one_returning(self, data: dict):
+        stmt = insert(self.model).values(**data).returning(self.model)
+        res = await self.session.execute(stmt)
+        return res.scalar_one()
+
+    async def find_at(self, jetton: str, at: datetime.datetime):
+        """Returns the last sample taken at or before the given time."""
+        stmt = (
+            select(self.model)
+            .where(self.model.jetton == jetton, self.model.created_at <= at)
+            .order_by(self.model.created_at.desc())
+            .limit(1)
+        )
+        res = await self.session.execute(stmt)
+        return res.scalar_one_or_none()
+
+    async def find_range(
+        self,
+        jetton: str,
+        since: datetime.datetime,
+        until: Optional[datetime.datetime] = None,
+    ):
+        stmt = (
+            select(self.model)
+            .where(self.model.jetton == jetton, self.model.created_at >= since)
+            .order_by(self.model.created_at)
+        )
+        if until is not None:
+            stmt = stmt.where(self.model.created_at < until)
+        res = await self.session.execute(stmt)
+        return res.scalars().all()
@@ -0,0 +1,27 @@
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.db.models.model_stats import STATS_VIEWS, stats_holders, stats_summary
+
+
+class StatsRepository:
+    """Reads the materialized admin statistics."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def refresh(self):
+        # CONCURRENTLY keeps the views readable while they are rebuilt
+        for name in STATS_VIEWS:
+            await self.session.execute(
+                text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}")
+            )
+
+    async def find_summary(self):
+        res = await self.session.execute(select(stats_summary))
+        return res.one_or_none()
+
+    async def find_holders(self):
+        stmt = select(stats_holders).order_by(stats_holders.c.bucket)
+        res = await self.session.execute(stmt)
+        return res.all()
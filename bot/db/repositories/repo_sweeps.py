@@ -0,0 +1,18 @@
+from sqlalchemy import select
+
+from bot.db.models.model_sweeps import SweepsORM
+from bot.db.utils.repository import SQLAlchemyRepository
+
+
+class SweepsRepository(SQLAlchemyRepository):
+    model = SweepsORM
+
+    async def find_unfinished(self):
+        stmt = (
+            select(self.model)
+            .filter_by(finished=False)
+            .order_by(self.model.id.desc())
+            .limit(1)
+        )
+        res = await self.session.execute(stmt)
+        return res.scalar_one_or_none()
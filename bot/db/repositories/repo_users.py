@@ -1,6 +1,68 @@
+from sqlalchemy import func, or_, select, tuple_, update
+
 from bot.db.models.model_users import UsersORM
 from bot.db.utils.repository import SQLAlchemyRepository
 
 
 class UsersRepository(SQLAlchemyRepository):
     model = UsersORM
+
+    async def find_all_after(self, last_id: int):
+        stmt = select(self.model).where(self.model.id > last_id).order_by(self.model.id)
+        res = await self.session.execute(stmt)
+        return res.scalars().all()
+
+    async def find_by_wallet(self, wallet: str):
+        stmt = select(self.model).filter_by(wallet=wallet).order_by(self.model.id)
+        res = await self.session.execute(stmt)
+        return res.scalars().all()
+
+    async def count(self) -> int:
+        stmt = select(func.count()).select_from(self.model)
+        res = await self.session.execute(stmt)
+        return res.scalar_one()
+
+    async def mark_checked(self, ids: list[int]):
+        stmt = (
+            update(self.model)
+            .where(self.model.id.in_(ids))
+            .values(checked_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(stmt)
+
+    async def find_with_invite_links(self):
+        stmt = select(self.model).where(
+            or_(
+                func.coalesce(self.model.invite_link, "") != "",
+                func.coalesce(self.model.channel_invite_link, "") != "",
+            )
+        )
+        res = await self.session.execute(stmt)
+        return res.scalars().all()
+
+    async def clear_invite_links(
+        self, links: list[tuple[int, str]], channel: bool = False
+    ):
+        """
+        Clears invite links of users that still have the given ones.
+
+        :param links: (user id, invite link) pairs, a user whose link changed
+            since is left alone.
+        :param channel: Whether to clear the channel invite links.
+        """
+        prefix = "channel_" if channel else ""
+        column = getattr(self.model, f"{prefix}invite_link")
+        stmt = (
+            update(self.model)
+            .where(tuple_(self.model.id, column).in_(links))
+            .values(
+                {
+                    f"{prefix}invite_link": None,
+                    f"{prefix}invite_link_created_at": None,
+                    f"{prefix}invite_link_expires_at": None,
+                }
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(stmt)
@@ -1,3 +1,6 @@
+import datetime
+from typing import Optional
+
 from pydantic import BaseModel
 from sqlalchemy import BigInteger
 
@@ -5,8 +8,11 @@ from sqlalchemy import BigInteger
 class HistorySchemaAdd(BaseModel):
     user_id: int
     balance_delta: int
-    price: float
+    # price sample in effect when the change was recorded
+    price_id: Optional[int] = None
     wallet: str
+    # ban or unban recorded by the entry, None for plain balance changes
+    action: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -14,3 +20,14 @@ class HistorySchemaAdd(BaseModel):
 
 class UserSchema(HistorySchemaAdd):
     id: int
+
+
+class HistoryDailyTotalsSchema(BaseModel):
+    day: datetime.date
+    net_delta: int
+    volume: int
+    users: int
+    changes: int
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,19 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class OutboxSchemaAdd(BaseModel):
+    key: str
+    action: str
+    payload: dict
+
+    class Config:
+        from_attributes = True
+
+
+class OutboxSchema(OutboxSchemaAdd):
+    id: int
+    status: str
+    attempts: int
+    last_error: Optional[str] = None
@@ -0,0 +1,16 @@
+import datetime
+
+from pydantic import BaseModel
+
+
+class PriceSchemaAdd(BaseModel):
+    jetton: str
+    price: float
+
+    class Config:
+        from_attributes = True
+
+
+class PriceSchema(PriceSchemaAdd):
+    id: int
+    created_at: datetime.datetime
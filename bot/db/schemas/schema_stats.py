@@ -0,0 +1,32 @@
+import datetime
+
+from pydantic import BaseModel
+
+
+class HoldersBucketSchema(BaseModel):
+    # lower bound of the balance range, a power of ten or 0
+    bucket: int
+    holders: int
+    members: int
+    balance: int
+
+    class Config:
+        from_attributes = True
+
+
+class StatsSummarySchema(BaseModel):
+    members: int
+    og: int
+    banned: int
+    blacklisted: int
+    balance: int
+    bought: int
+    sold: int
+    buyers: int
+    sellers: int
+    bans: int
+    unbans: int
+    refreshed_at: datetime.datetime
+
+    class Config:
+        from_attributes = True
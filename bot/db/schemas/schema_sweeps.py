@@ -0,0 +1,25 @@
+import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class SweepSchemaAdd(BaseModel):
+    finished: bool = False
+    last_user_id: int = 0
+    users_total: int = 0
+    users_processed: int = 0
+    users_skipped: int = 0
+    flips_suppressed: int = 0
+    bans: int = 0
+    unbans: int = 0
+    resumes: int = 0
+    finished_at: Optional[datetime.datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class SweepSchema(SweepSchemaAdd):
+    id: int
+    created_at: datetime.datetime
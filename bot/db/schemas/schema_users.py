@@ -1,3 +1,4 @@
+import datetime
 from typing import Optional
 from pydantic import BaseModel
 from sqlalchemy import BigInteger
@@ -10,6 +11,10 @@ class UserSchemaAdd(BaseModel):
     banned: bool
     invite_link: Optional[str] = None
     channel_invite_link: Optional[str] = None
+    invite_link_created_at: Optional[datetime.datetime] = None
+    invite_link_expires_at: Optional[datetime.datetime] = None
+    channel_invite_link_created_at: Optional[datetime.datetime] = None
+    channel_invite_link_expires_at: Optional[datetime.datetime] = None
     wallet: str
     tg_user_id: int
     entry_balance: int
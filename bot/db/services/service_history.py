@@ -0,0 +1,56 @@
+import datetime
+
+from bot.db.repositories.repo_history import next_month, partition_month
+from bot.db.schemas.schema_history import HistoryDailyTotalsSchema
+from bot.db.utils.unitofwork import IUnitOfWork
+
+
+class HistoryService:
+    async def maintain_partitions(
+        self,
+        uow: IUnitOfWork,
+        months_ahead: int,
+        retention_months: int,
+        archive: bool = False,
+    ) -> list[str]:
+        """Creates upcoming monthly partitions and retires the expired ones.
+
+        :param retention_months: Months of history kept, 0 keeps everything.
+        :return: Names of the retired partitions.
+        """
+        month = datetime.date.today().replace(day=1)
+        # the first month that is still kept
+        oldest = month
+        for _ in range(retention_months):
+            oldest = (oldest - datetime.timedelta(days=1)).replace(day=1)
+
+        retired = []
+        async with uow:
+            for _ in range(months_ahead + 1):
+                await uow.history.create_partition(month)
+                month = next_month(month)
+
+            partitions = (
+                await uow.history.find_partitions() if retention_months > 0 else []
+            )
+            for name in partitions:
+                partition_start = partition_month(name)
+                if partition_start is None or partition_start >= oldest:
+                    continue
+                if archive:
+                    await uow.history.archive_partition(name)
+                else:
+                    await uow.history.drop_partition(name)
+                retired.append(name)
+            await uow.commit()
+        return retired
+
+    async def get_daily_totals(
+        self, uow: IUnitOfWork, since: datetime.date
+    ) -> list[HistoryDailyTotalsSchema]:
+        async with uow:
+            totals = await uow.history_daily.find_totals(since)
+            return [
+                HistoryDailyTotalsSchema.model_validate(row, from_attributes=True)
+                for row in totals
+            ]
@@ -0,0 +1,53 @@
+from bot.db.schemas.schema_outbox import OutboxSchema, OutboxSchemaAdd
+from bot.db.utils.unitofwork import IUnitOfWork
+
+
+class OutboxService:
+    async def add_entries(self, uow: IUnitOfWork, entries: list[OutboxSchemaAdd]):
+        async with uow:
+            await uow.outbox.add_many([entry.model_dump() for entry in entries])
+            await uow.commit()
+
+    async def claim_due(
+        self, uow: IUnitOfWork, limit: int, lease: int
+    ) -> list[OutboxSchema]:
+        async with uow:
+            entries = await uow.outbox.claim_due(limit=limit, lease=lease)
+            entries = [
+                OutboxSchema.model_validate(entry, from_attributes=True)
+                for entry in entries
+            ]
+            await uow.commit()
+            return entries
+
+    async def complete(self, uow: IUnitOfWork, entry: OutboxSchema):
+        async with uow:
+            await uow.outbox.edit_one(
+                entry.id, {"status": "done", "attempts": entry.attempts + 1}
+            )
+            await uow.commit()
+
+    async def fail(
+        self,
+        uow: IUnitOfWork,
+        entry: OutboxSchema,
+        error: str,
+        retry_delay: float,
+        give_up: bool = False,
+        count_attempt: bool = True,
+    ):
+        """
+        Schedules a retry of the entry or marks it failed.
+
+        :param count_attempt: Whether the failure counts towards the attempts,
+            outages of Telegram itself don't.
+        """
+        attempts = entry.attempts + 1 if count_attempt else entry.attempts
+        entry_dict = {"attempts": attempts, "last_error": error}
+        async with uow:
+            if give_up:
+                entry_dict["status"] = "failed"
+                await uow.outbox.edit_one(entry.id, entry_dict)
+            else:
+                await uow.outbox.retry_later(entry.id, retry_delay, entry_dict)
+            await uow.commit()
@@ -0,0 +1,38 @@
+import datetime
+from typing import Optional
+
+from bot.db.schemas.schema_prices import PriceSchema, PriceSchemaAdd
+from bot.db.utils.unitofwork import IUnitOfWork
+
+
+class PricesService:
+    async def add_price(self, uow: IUnitOfWork, price: PriceSchemaAdd) -> PriceSchema:
+        async with uow:
+            sample = await uow.prices.add_one_returning(price.model_dump())
+            await uow.commit()
+            return PriceSchema.model_validate(sample, from_attributes=True)
+
+    async def get_price_at(
+        self, uow: IUnitOfWork, jetton: str, at: datetime.datetime
+    ) -> Optional[PriceSchema]:
+        """Returns the price of a jetton in effect at the given time."""
+        async with uow:
+            sample = await uow.prices.find_at(jetton, at)
+            if sample is None:
+                return None
+            return PriceSchema.model_validate(sample, from_attributes=True)
+
+    async def get_prices(
+        self,
+        uow: IUnitOfWork,
+        jetton: str,
+        since: datetime.datetime,
+        until: Optional[datetime.datetime] = None,
+    ) -> list[PriceSchema]:
+        """Returns price samples of a jetton in a time range, oldest first."""
+        async with uow:
+            samples = await uow.prices.find_range(jetton, since, until)
+            return [
+                PriceSchema.model_validate(sample, from_attributes=True)
+                for sample in samples
+            ]
@@ -0,0 +1,26 @@
+from typing import Optional
+
+from bot.db.schemas.schema_stats import HoldersBucketSchema, StatsSummarySchema
+from bot.db.utils.unitofwork import IUnitOfWork
+
+
+class StatsService:
+    async def refresh(self, uow: IUnitOfWork):
+        async with uow:
+            await uow.stats.refresh()
+            await uow.commit()
+
+    async def get_summary(self, uow: IUnitOfWork) -> Optional[StatsSummarySchema]:
+        async with uow:
+            summary = await uow.stats.find_summary()
+            if summary is None:
+                return None
+            return StatsSummarySchema.model_validate(summary, from_attributes=True)
+
+    async def get_holders(self, uow: IUnitOfWork) -> list[HoldersBucketSchema]:
+        async with uow:
+            holders = await uow.stats.find_holders()
+            return [
+                HoldersBucketSchema.model_validate(row, from_attributes=True)
+                for row in holders
+            ]
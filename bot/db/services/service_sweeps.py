@@ -0,0 +1,47 @@
+from sqlalchemy import func
+
+from bot.db.schemas.schema_sweeps import SweepSchema, SweepSchemaAdd
+from bot.db.utils.unitofwork import IUnitOfWork
+
+
+class SweepsService:
+    async def start_sweep(self, uow: IUnitOfWork) -> SweepSchema:
+        """Resumes the last unfinished sweep or starts a new one."""
+        async with uow:
+            sweep = await uow.sweeps.find_unfinished()
+            if sweep is None:
+                users_total = await uow.users.count()
+                sweep_id = await uow.sweeps.add_one(
+                    SweepSchemaAdd(users_total=users_total).model_dump()
+                )
+            else:
+                sweep_id = sweep.id
+                await uow.sweeps.edit_one(sweep_id, {"resumes": sweep.resumes + 1})
+            await uow.commit()
+            sweep = await uow.sweeps.find_one(id=sweep_id)
+            return SweepSchema.model_validate(sweep, from_attributes=True)
+
+    async def checkpoint(
+        self,
+        uow: IUnitOfWork,
+        sweep: SweepSchema,
+        checked_user_ids: list[int],
+        finished: bool = False,
+    ):
+        """Persists the sweep cursor and stamps the users checked since the last checkpoint."""
+        sweep_dict = {
+            "last_user_id": sweep.last_user_id,
+            "users_processed": sweep.users_processed,
+            "users_skipped": sweep.users_skipped,
+            "flips_suppressed": sweep.flips_suppressed,
+            "bans": sweep.bans,
+            "unbans": sweep.unbans,
+        }
+        if finished:
+            sweep_dict["finished"] = True
+            sweep_dict["finished_at"] = func.now()
+        async with uow:
+            if checked_user_ids:
+                await uow.users.mark_checked(checked_user_ids)
+            await uow.sweeps.edit_one(sweep.id, sweep_dict)
+            await uow.commit()
@@ -1,6 +1,10 @@
+from sqlalchemy.exc import NoResultFound
+
 from bot.db.schemas.schema_users import UserSchema, UserSchemaAdd
 from bot.db.schemas.schema_history import HistorySchemaAdd
+from bot.db.schemas.schema_outbox import OutboxSchemaAdd
 
+from bot.db.utils.cache import NOT_CACHED, get_user_cache
 from bot.db.utils.unitofwork import IUnitOfWork
 
 
@@ -10,16 +14,59 @@ class UsersService:
         async with uow:
             user_id = await uow.users.add_one(user_dict)
             await uow.commit()
-            return user_id
+        await get_user_cache().invalidate(user.tg_user_id)
+        return user_id
+
+    async def get_users(self, uow: IUnitOfWork, after_id: int = 0) -> list[UserSchema]:
+        async with uow:
+            users = await uow.users.find_all_after(after_id)
+            users = [
+                UserSchema.model_validate(user, from_attributes=True) for user in users
+            ]
+            return users
+
+    async def get_users_by_wallet(
+        self, uow: IUnitOfWork, wallet: str
+    ) -> list[UserSchema]:
+        async with uow:
+            users = await uow.users.find_by_wallet(wallet)
+            users = [
+                UserSchema.model_validate(user, from_attributes=True) for user in users
+            ]
+            return users
 
-    async def get_users(self, uow: IUnitOfWork) -> list[UserSchema]:
+    async def get_users_with_invite_links(self, uow: IUnitOfWork) -> list[UserSchema]:
         async with uow:
-            users = await uow.users.find_all()
+            users = await uow.users.find_with_invite_links()
             users = [
                 UserSchema.model_validate(user, from_attributes=True) for user in users
             ]
             return users
 
+    async def clear_invite_links(
+        self,
+        uow: IUnitOfWork,
+        chat_users: list[UserSchema],
+        channel_users: list[UserSchema],
+    ):
+        if not chat_users and not channel_users:
+            return
+        async with uow:
+            # only the links the users were read with, a link assigned
+            # meanwhile wasn't revoked and must stay
+            if chat_users:
+                await uow.users.clear_invite_links(
+                    [(user.id, user.invite_link) for user in chat_users]
+                )
+            if channel_users:
+                await uow.users.clear_invite_links(
+                    [(user.id, user.channel_invite_link) for user in channel_users],
+                    channel=True,
+                )
+            await uow.commit()
+        for user in chat_users + channel_users:
+            await get_user_cache().invalidate(user.tg_user_id)
+
     async def get_user(self, uow: IUnitOfWork, user_id: int):
         async with uow:
             user = await uow.users.find_one(id=user_id)
@@ -27,10 +74,16 @@ class UsersService:
             return user
 
     async def get_user_by_tg_id(self, uow: IUnitOfWork, tg_user_id: int):
-        async with uow:
-            user = await uow.users.find_one(tg_user_id=tg_user_id)
-            user = UserSchema.model_validate(user, from_attributes=True)
-            return user
+        user = await get_user_cache().get(tg_user_id)
+        if user is NOT_CACHED:
+            async with uow:
+                user = await uow.users.find_one_or_none(tg_user_id=tg_user_id)
+                if user is not None:
+                    user = UserSchema.model_validate(user, from_attributes=True)
+            await get_user_cache().set(tg_user_id, user)
+        if user is None:
+            raise NoResultFound(f"No user with tg_user_id={tg_user_id}")
+        return user
 
     async def edit_user(
         self,
@@ -38,10 +91,22 @@ class UsersService:
         user_id: int,
         user: UserSchema,
         history_entry: HistorySchemaAdd = None,
+        outbox_entries: list[OutboxSchemaAdd] = None,
     ):
+        """Updates the user, writing history and outbox entries in the same transaction."""
         user_dict = user.model_dump()
         async with uow:
             await uow.users.edit_one(user_id, user_dict)
             if isinstance(history_entry, HistorySchemaAdd):
                 await uow.history.add_one(history_entry.model_dump())
+                await uow.history_daily.add_change(
+                    user_id=history_entry.user_id,
+                    balance_delta=history_entry.balance_delta,
+                    balance=user.balance,
+                )
+            if outbox_entries:
+                await uow.outbox.add_many(
+                    [entry.model_dump() for entry in outbox_entries]
+                )
             await uow.commit()
+        await get_user_cache().invalidate(user.tg_user_id)
@@ -0,0 +1,86 @@
+import functools
+import json
+import logging
+from typing import Optional
+
+from cachetools import TTLCache
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from bot.config import settings
+from bot.db.schemas.schema_users import UserSchema
+
+# returned by UserCache.get() when the cache knows nothing about the user
+NOT_CACHED = object()
+
+
+class UserCache:
+    """
+    Read-through cache of users keyed by Telegram user id.
+
+    Unknown users are cached as well (negative caching), so a new user
+    reconnecting a wallet does not hit the database every time.
+    """
+
+    def __init__(
+        self, ttl: float, maxsize: int = 10_000, redis: Optional[Redis] = None
+    ) -> None:
+        """
+        :param ttl: Time-to-live of cached entries in seconds.
+        :param maxsize: Maximum number of entries kept in process memory.
+        :param redis: Optional Redis client to share the cache between processes.
+        """
+        self.ttl = ttl
+        self.redis = redis
+        self.memory: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def _key(tg_user_id: int) -> str:
+        return f"user:{tg_user_id}"
+
+    async def get(self, tg_user_id: int):
+        """Returns the cached user, None for a cached miss or NOT_CACHED."""
+        if self.redis is None:
+            user_dict = self.memory.get(tg_user_id, NOT_CACHED)
+        else:
+            try:
+                raw = await self.redis.get(self._key(tg_user_id))
+            except RedisError:
+                logging.error("RedisError in UserCache.get()")
+                return NOT_CACHED
+            user_dict = NOT_CACHED if raw is None else json.loads(raw)
+
+        if user_dict is NOT_CACHED or user_dict is None:
+            return user_dict
+        # callers mutate the returned schema, never hand out the cached one
+        return UserSchema.model_validate(user_dict)
+
+    async def set(self, tg_user_id: int, user: Optional[UserSchema]):
+        # JSON-safe in both backends, datetimes are parsed back by get()
+        user_dict = user.model_dump(mode="json") if user is not None else None
+        if self.redis is None:
+            self.memory[tg_user_id] = user_dict
+            return
+        try:
+            await self.redis.set(
+                self._key(tg_user_id), json.dumps(user_dict), ex=int(self.ttl)
+            )
+        except RedisError:
+            logging.error("RedisError in UserCache.set()")
+
+    async def invalidate(self, tg_user_id: int):
+        self.memory.pop(tg_user_id, None)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.delete(self._key(tg_user_id))
+        except RedisError:
+            logging.error("RedisError in UserCache.invalidate()")
+
+
+@functools.cache
+def get_user_cache() -> UserCache:
+    return UserCache(
+        ttl=settings.USER_CACHE_TTL,
+        redis=Redis.from_url(settings.REDIS_DSN) if settings.USER_CACHE_REDIS else None,
+    )
@@ -1,15 +1,30 @@
+import time
 from abc import ABC, abstractmethod
-from typing import Type
+from contextvars import ContextVar, Token
+from typing import Optional, Type
 
-from bot.db.db import async_session_maker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.db.db import get_session_maker
 from bot.db.repositories.repo_users import UsersRepository
-from bot.db.repositories.repo_history import HistoryRepository
+from bot.db.repositories.repo_history import HistoryDailyRepository, HistoryRepository
+from bot.db.repositories.repo_sweeps import SweepsRepository
+from bot.db.repositories.repo_outbox import OutboxRepository
+from bot.db.repositories.repo_prices import PricesRepository
+from bot.db.repositories.repo_stats import StatsRepository
+from bot.utils.metrics import DB_TRANSACTION_DURATION
+from bot.utils.tracing import record_span
 
 
 # https://github1s.com/cosmicpython/code/tree/chapter_06_uow
 class IUnitOfWork(ABC):
     users: Type[UsersRepository]
     history: Type[HistoryRepository]
+    history_daily: Type[HistoryDailyRepository]
+    sweeps: Type[SweepsRepository]
+    outbox: Type[OutboxRepository]
+    stats: Type[StatsRepository]
+    prices: Type[PricesRepository]
 
     @abstractmethod
     def __init__(self): ...
@@ -27,19 +42,98 @@ class IUnitOfWork(ABC):
     async def rollback(self): ...
 
 
-class UnitOfWork:
-    def __init__(self):
-        self.session_factory = async_session_maker
+class _UnitOfWorkContext:
+    """Session and repositories of a single ``async with uow:`` block."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.token: Optional[Token] = None
+        self.started = time.monotonic()
+
+        self.users = UsersRepository(session)
+        self.history = HistoryRepository(session)
+        self.history_daily = HistoryDailyRepository(session)
+        self.sweeps = SweepsRepository(session)
+        self.outbox = OutboxRepository(session)
+        self.stats = StatsRepository(session)
+        self.prices = PricesRepository(session)
+
+
+class UnitOfWork(IUnitOfWork):
+    """
+    Unit of work shared by handlers and background jobs.
+
+    Every ``async with uow:`` opens its own session bound to the current
+    asyncio context, so concurrent tasks using the same instance never
+    share a transaction.
+    """
+
+    def __init__(self, session_factory: Optional[async_sessionmaker] = None):
+        """
+        :param session_factory: Session factory, the one of the default
+            engine by default, which is only created when first needed.
+        """
+        self._session_factory = session_factory
+        self._context: ContextVar[Optional[_UnitOfWorkContext]] = ContextVar(
+            f"uow_{id(self)}", default=None
+        )
+
+    @property
+    def session_factory(self) -> async_sessionmaker:
+        return self._session_factory or get_session_maker()
+
+    def _current(self) -> _UnitOfWorkContext:
+        context = self._context.get()
+        if context is None:
+            raise RuntimeError("UnitOfWork is used outside of 'async with'")
+        return context
+
+    @property
+    def session(self) -> AsyncSession:
+        return self._current().session
+
+    @property
+    def users(self) -> UsersRepository:
+        return self._current().users
+
+    @property
+    def history(self) -> HistoryRepository:
+        return self._current().history
+
+    @property
+    def history_daily(self) -> HistoryDailyRepository:
+        return self._current().history_daily
+
+    @property
+    def sweeps(self) -> SweepsRepository:
+        return self._current().sweeps
+
+    @property
+    def outbox(self) -> OutboxRepository:
+        return self._current().outbox
+
+    @property
+    def stats(self) -> StatsRepository:
+        return self._current().stats
 
-    async def __aenter__(self):
-        self.session = self.session_factory()
+    @property
+    def prices(self) -> PricesRepository:
+        return self._current().prices
 
-        self.users = UsersRepository(self.session)
-        self.history = HistoryRepository(self.session)
+    async def __aenter__(self) -> "UnitOfWork":
+        context = _UnitOfWorkContext(self.session_factory())
+        context.token = self._context.set(context)
+        return self
 
     async def __aexit__(self, *args):
-        await self.rollback()
-        await self.session.close()
+        context = self._current()
+        try:
+            await context.session.rollback()
+            await context.session.close()
+        finally:
+            self._context.reset(context.token)
+            DB_TRANSACTION_DURATION.observe(time.monotonic() - context.started)
+            record_span("db", context.started)
 
     async def commit(self):
         await self.session.commit()
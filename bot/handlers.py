@@ -1,3 +1,4 @@
+import datetime
 from typing import Union
 
 from aiogram import Router, F
@@ -8,6 +9,11 @@ from aiogram.types import Message, CallbackQuery
 from aiogram_tonconnect import ATCManager
 from aiogram_tonconnect.tonconnect.models import ConnectWalletCallbacks
 
+from .config import settings
+from .db.services.service_history import HistoryService
+from .db.services.service_stats import StatsService
+from .db.utils.unitofwork import UnitOfWork
+from .utils.circuit_breaker import CLOSED, HALF_OPEN, CircuitBreaker
 from .windows import (
     UserState,
     main_menu_window,
@@ -20,7 +26,16 @@ router.message.filter(F.chat.type == ChatType.PRIVATE)
 router.callback_query.filter(F.message.chat.type == ChatType.PRIVATE)
 
 
-@router.message(Command("start"))
+def is_admin_chat(message: Message) -> bool:
+    # the settings are read when the first message arrives, not on import
+    return message.chat.id == settings.ADMIN_CHAT_ID
+
+
+admin_router = Router()
+admin_router.message.filter(is_admin_chat)
+
+
+@router.message(Command("start"), flags={"throttling_key": "connect"})
 async def start_command(message: Message, atc_manager: ATCManager) -> None:
     """
     Handler for the /start command.
@@ -41,7 +56,7 @@ async def start_command(message: Message, atc_manager: ATCManager) -> None:
     await atc_manager.connect_wallet(callbacks, check_proof=True)
 
 
-@router.callback_query(UserState.main_menu)
+@router.callback_query(UserState.main_menu, flags={"throttling_key": "connect"})
 async def main_menu_handler(call: CallbackQuery, atc_manager: ATCManager) -> None:
     """
     Handler for the main menu callback.
@@ -70,3 +85,96 @@ async def main_menu_handler(call: CallbackQuery, atc_manager: ATCManager) -> Non
 
     # Acknowledge the callback query
     await call.answer()
+
+
+@admin_router.message(Command("status"))
+async def status_command(message: Message, breakers: list[CircuitBreaker]) -> None:
+    """
+    Handler for the admin /status command.
+
+    :param message: The Message object representing the incoming command.
+    :param breakers: Circuit breakers of the bot's dependencies.
+    :return: None
+    """
+    state_icons = {CLOSED: "✅", HALF_OPEN: "🟡"}
+    lines = ["Состояние сервисов:\n"]
+    for breaker in breakers:
+        status = breaker.status()
+        lines.append(
+            f"{state_icons.get(status['state'], '❌')} {status['name']}: {status['state']}, "
+            f"ошибок подряд: {status['failures']}, "
+            f"срабатываний: {status['trips']}, "
+            f"отклонено запросов: {status['rejected']}"
+        )
+    await message.answer("\n".join(lines))
+
+
+@admin_router.message(Command("stats"))
+async def stats_command(message: Message, uow: UnitOfWork) -> None:
+    """
+    Handler for the admin /stats command.
+
+    Answers from the statistics refreshed after every sweep and the daily
+    history rollups of the last week.
+
+    :param message: The Message object representing the incoming command.
+    :param uow: Unit of work.
+    :return: None
+    """
+    summary = await StatsService().get_summary(uow=uow)
+    if summary is None:
+        await message.answer("Статистика ещё не собрана")
+        return
+    # read from the daily rollups, cheap enough to skip the views
+    days = await HistoryService().get_daily_totals(
+        uow=uow, since=datetime.date.today() - datetime.timedelta(days=6)
+    )
+
+    await message.answer(
+        f"Статистика на {summary.refreshed_at:%d.%m.%Y %H:%M}\n\n"
+        f"Участников: {summary.members} (с пресейла: {summary.og})\n"
+        f"Забанено: {summary.banned}\n"
+        f"В ЧС: {summary.blacklisted}\n"
+        f"WON у участников: {summary.balance}\n\n"
+        f"За сегодня:\n"
+        f"🟢 Куплено: {summary.bought} WON ({summary.buyers} польз.)\n"
+        f"🔴 Продано: {summary.sold} WON ({summary.sellers} польз.)\n"
+        f"Итого: {summary.bought - summary.sold:+} WON\n"
+        f"❌ Банов: {summary.bans}\n"
+        f"✅ Разбанов: {summary.unbans}\n\n"
+        f"По дням:\n"
+        + "\n".join(
+            f"{day.day:%d.%m}: {day.net_delta:+} WON, оборот {day.volume} WON, "
+            f"польз.: {day.users}"
+            for day in days
+        )
+    )
+
+
+@admin_router.message(Command("holders"))
+async def holders_command(message: Message, uow: UnitOfWork) -> None:
+    """
+    Handler for the admin /holders command.
+
+    Shows how WON is distributed among users by orders of magnitude.
+
+    :param message: The Message object representing the incoming command.
+    :param uow: Unit of work.
+    :return: None
+    """
+    holders = await StatsService().get_holders(uow=uow)
+    if not holders:
+        await message.answer("Статистика ещё не собрана")
+        return
+
+    lines = ["Распределение держателей:\n"]
+    for row in holders:
+        if row.bucket == 0:
+            balance_range = "0"
+        else:
+            balance_range = f"{row.bucket}–{row.bucket * 10 - 1}"
+        lines.append(
+            f"{balance_range} WON: {row.holders} "
+            f"(участников: {row.members}, всего {row.balance} WON)"
+        )
+    await message.answer("\n".join(lines))
@@ -1,19 +1,130 @@
-from typing import Any, Awaitable, Callable, Dict, MutableMapping, Optional
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
 
 from aiogram import BaseMiddleware
 from aiogram.dispatcher.flags import get_flag
 from aiogram.types import TelegramObject, User
-from cachetools import TTLCache
+from redis.asyncio import Redis
+
+from bot.utils.metrics import THROTTLED_UPDATES
+
+
+class ThrottlingBackend(ABC):
+    """
+    Storage deciding whether an update should be throttled.
+    """
+
+    @abstractmethod
+    async def hit(self, key: str, user_id: int, ttl: float) -> bool:
+        """
+        Register an update of the user.
+
+        :param key: The throttling key.
+        :param user_id: The user's Telegram id.
+        :param ttl: Minimal interval in seconds between updates for the key.
+        :return: True if the update should be dropped.
+        """
+        raise NotImplementedError
+
+
+class MemoryThrottlingBackend(ThrottlingBackend):
+    """
+    Process-local backend.
+
+    Unlike a size-bounded cache it never evicts users that are still
+    throttled, expired entries are purged periodically instead.
+    """
+
+    def __init__(self, purge_interval: float = 60) -> None:
+        """
+        :param purge_interval: Interval in seconds between purges of expired entries.
+        """
+        self.purge_interval = purge_interval
+        self.deadlines: Dict[Tuple[str, int], float] = {}
+        self.next_purge = 0.0
+
+    def _purge(self, now: float) -> None:
+        self.deadlines = {
+            entry: deadline
+            for entry, deadline in self.deadlines.items()
+            if deadline > now
+        }
+        self.next_purge = now + self.purge_interval
+
+    async def hit(self, key: str, user_id: int, ttl: float) -> bool:
+        now = time.monotonic()
+        if now >= self.next_purge:
+            self._purge(now)
+
+        deadline = self.deadlines.get((key, user_id))
+        if deadline is not None and deadline > now:
+            return True
+        self.deadlines[(key, user_id)] = now + ttl
+        return False
+
+
+class RedisThrottlingBackend(ThrottlingBackend):
+    """
+    Backend shared between processes, implementing GCRA in Redis.
+    """
+
+    # returns 1 if the update has to be dropped, uses Redis time so that
+    # clocks of the bot replicas don't matter
+    GCRA_SCRIPT = """
+    local emission = tonumber(ARGV[1])
+    local tolerance = tonumber(ARGV[2])
+    local time = redis.call("TIME")
+    local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+    local tat = tonumber(redis.call("GET", KEYS[1])) or now
+    if tat < now then
+        tat = now
+    end
+    if now < tat - tolerance then
+        return 1
+    end
+    tat = tat + emission
+    redis.call("SET", KEYS[1], tat, "PX", math.ceil(tat - now))
+    return 0
+    """
+
+    def __init__(
+        self, redis: Redis, prefix: str = "throttling", burst: int = 1
+    ) -> None:
+        """
+        :param redis: Redis client.
+        :param prefix: Prefix of the Redis keys.
+        :param burst: Number of updates allowed in a row before throttling.
+        """
+        self.redis = redis
+        self.prefix = prefix
+        self.burst = burst
+
+    async def hit(self, key: str, user_id: int, ttl: float) -> bool:
+        emission = int(ttl * 1000)
+        dropped = await self.redis.eval(
+            self.GCRA_SCRIPT,
+            1,
+            f"{self.prefix}:{key}:{user_id}",
+            emission,
+            emission * (self.burst - 1),
+        )
+        return bool(dropped)
 
 
 class ThrottlingMiddleware(BaseMiddleware):
     """
     Middleware for handling throttling.
+
+    Register it on the message/callback_query observers so that the
+    ``throttling_key`` flag of the handler is available.
     """
 
     def __init__(
             self,
             *,
+            backend: Optional[ThrottlingBackend] = None,
             default_key: Optional[str] = "default",
             default_ttl: float = .7,
             **ttl_map: float,
@@ -21,6 +132,7 @@ class ThrottlingMiddleware(BaseMiddleware):
         """
         Initialize the ThrottlingMiddleware.
 
+        :param backend: Throttling backend, process-local memory by default.
         :param default_key: The default key for throttling.
         :param default_ttl: The default time-to-live (TTL) in seconds for the default key.
         :param ttl_map: Mapping of keys to corresponding TTL values.
@@ -28,9 +140,11 @@ class ThrottlingMiddleware(BaseMiddleware):
         if default_key:
             ttl_map[default_key] = default_ttl
         self.default_key = default_key
-        self.caches: Dict[str, MutableMapping[int, None]] = {}
-        for name, ttl in ttl_map.items():
-            self.caches[name] = TTLCache(maxsize=10_000, ttl=ttl)
+        self.default_ttl = default_ttl
+        self.ttl_map = ttl_map
+        self.backend = backend or MemoryThrottlingBackend()
+        # number of dropped updates per throttling key
+        self.dropped: Counter = Counter()
 
     async def __call__(
             self,
@@ -49,13 +163,14 @@ class ThrottlingMiddleware(BaseMiddleware):
         user: Optional[User] = data.get("event_from_user", None)
 
         if user is not None:
-            # Get the throttling key from data or use the default key
+            # Get the throttling key from the handler flags or use the default key
             throttling_key = get_flag(data, "throttling_key", default=self.default_key)
+            ttl = self.ttl_map.get(throttling_key, self.default_ttl)
             # Check if the user is already throttled for the given key
-            if throttling_key and user.id in self.caches[throttling_key]:
+            if throttling_key and await self.backend.hit(throttling_key, user.id, ttl):
+                self.dropped[throttling_key] += 1
+                THROTTLED_UPDATES.labels(throttling_key).inc()
                 return None
-            # Add the user to the cache to indicate throttling
-            self.caches[throttling_key][user.id] = None
 
         # Call the handler function with the event and data
         return await handler(event, data)
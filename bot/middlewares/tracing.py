@@ -0,0 +1,81 @@
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from bot.utils.metrics import SLOW_UPDATES, UPDATE_DURATION
+from bot.utils.tracing import Trace, current_trace
+
+# own logger, so that sampled traces can be shown while the rest of the bot
+# only logs errors
+logger = logging.getLogger(__name__)
+
+
+class Tracer:
+    """
+    Times units of work end to end and traces them.
+
+    Spans of external calls and database transactions are recorded for
+    every unit, so a unit slower than the budget is always logged with its
+    span breakdown. Only a sample of the units within the budget is logged,
+    at info level.
+    """
+
+    def __init__(self, sample_rate: float = 0.05, slow_budget: float = 3) -> None:
+        """
+        :param sample_rate: Share of units within the budget that are logged.
+        :param slow_budget: Duration in seconds above which a unit is logged.
+        """
+        self.sample_rate = sample_rate
+        self.slow_budget = slow_budget
+
+    @asynccontextmanager
+    async def trace(self, kind: str, name: str):
+        """
+        Times the enclosed block.
+
+        :param kind: Kind of the unit, the label of the metrics.
+        :param name: Name of the unit in the slow log.
+        """
+        trace = Trace(name)
+        # also replaces the trace of an update the block was spawned from
+        token = current_trace.set(trace)
+        started = time.monotonic()
+        try:
+            yield trace
+        finally:
+            current_trace.reset(token)
+            duration = time.monotonic() - started
+            UPDATE_DURATION.labels(kind).observe(duration)
+            if duration > self.slow_budget:
+                SLOW_UPDATES.labels(kind).inc()
+                logger.error("Slow %s: %.3fs\n%s", name, duration, trace.format())
+            elif random.random() < self.sample_rate:
+                logger.info("%s: %.3fs\n%s", name, duration, trace.format())
+
+
+class TracingMiddleware(BaseMiddleware):
+    """
+    Outer update middleware timing every update with the tracer.
+
+    Register it with ``dp.update.outer_middleware`` so that the time
+    spent in the other middlewares is included.
+    """
+
+    def __init__(self, tracer: Tracer) -> None:
+        self.tracer = tracer
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with self.tracer.trace(
+            event.event_type, f"{event.event_type} update {event.update_id}"
+        ):
+            return await handler(event, data)
@@ -1,42 +1,200 @@
 import asyncio
 import logging
-from typing import Any, Awaitable, Callable, Dict
+import random
+from typing import Any, Awaitable, Callable, Dict, Optional
 
 from aiogram import BaseMiddleware, Bot
 from aiogram.types import TelegramObject
 from aiogram.utils import markdown
+from cachetools import TTLCache
 from dedust import Asset, Factory, PoolType
-from pytonapi import Tonapi
-from pytonapi.exceptions import TONAPIError
 from pytoniq import LiteBalancer
 from pytoniq.liteclient import LiteServerError
-from pytoniq_core import Address
 
 from bot.config import Settings
+from bot.db.schemas.schema_prices import PriceSchema, PriceSchemaAdd
 from bot.db.schemas.schema_users import UserSchema
+from bot.db.services.service_prices import PricesService
 from bot.db.utils.unitofwork import UnitOfWork
+from bot.middlewares.tracing import Tracer
+from bot.utils.balance_providers import BalanceProvider, start_lite_balancer
+from bot.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from bot.utils.invite_pool import InviteLinkPool
+from bot.utils.metrics import BALANCE_DRIFTS, HEDGED_REQUESTS, observe_call
+from bot.utils.singleflight import SingleFlight
 from bot.utils.user_manager import UserManager
 
 
 class TonApiHelper:
-    def __init__(self, ton_api: Tonapi):
-        self.ton_api = ton_api
+    """
+    Fetches jetton balances from a prioritized list of balance providers.
 
-    async def get_jetton_balance(self, wallet: str, jetton_addr: str) -> int:
+    If the first provider hasn't answered within its recent p95 latency the
+    request is hedged to the next one and whichever answers first wins.
+    A sample of results is cross-checked against another provider to
+    detect drift between them.
+    """
+
+    def __init__(
+        self,
+        providers: list[BalanceProvider],
+        cache_ttl: float = 0,
+        hedge_delay: float = 1,
+        min_hedge_delay: float = 0.2,
+        cross_check_rate: float = 0,
+    ):
+        self.providers = providers
+        self.cache = TTLCache(maxsize=10_000, ttl=cache_ttl) if cache_ttl > 0 else None
+        self.single_flight = SingleFlight()
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.cross_check_rate = cross_check_rate
+        self.hedged = 0
+        self.drifts = 0
+        self.cross_checks: set[asyncio.Task] = set()
+
+    @property
+    def available(self) -> bool:
+        """Tells whether any provider is not cut off by its circuit breaker."""
+        return any(provider.available for provider in self.providers)
+
+    async def warm_up(self) -> None:
+        """Connects every provider, a provider failing to connect is only logged."""
+        results = await asyncio.gather(
+            *(provider.warm_up() for provider in self.providers),
+            return_exceptions=True,
+        )
+        for provider, result in zip(self.providers, results):
+            if isinstance(result, Exception):
+                logging.error("Warm-up of %s failed: %s", provider.name, result)
+
+    def _get_hedge_delay(self, provider: BalanceProvider) -> float:
+        p95 = provider.latency.percentile(0.95)
+        if p95 is None:
+            return self.hedge_delay
+        return max(p95, self.min_hedge_delay)
+
+    async def _fetch_jetton_balances(
+        self, wallet: str, jetton_addrs: tuple[str, ...]
+    ) -> dict[str, int]:
+        providers = [provider for provider in self.providers if provider.available]
+        tasks: dict[asyncio.Task, BalanceProvider] = {}
+        try:
+            while providers or tasks:
+                if providers:
+                    provider = providers.pop(0)
+                    task = asyncio.create_task(
+                        provider.get_jetton_balances(wallet, jetton_addrs)
+                    )
+                    tasks[task] = provider
+                    # hedge to the next provider if this one is slow
+                    timeout = self._get_hedge_delay(provider) if providers else None
+                else:
+                    timeout = None
+
+                done, _ = await asyncio.wait(
+                    tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    self.hedged += 1
+                    HEDGED_REQUESTS.inc()
+                for task in done:
+                    provider = tasks.pop(task)
+                    if task.exception() is None:
+                        balances = task.result()
+                        self._maybe_cross_check(
+                            wallet, jetton_addrs, provider, balances
+                        )
+                        return balances
+                    if not isinstance(task.exception(), CircuitOpenError):
+                        logging.error(
+                            "Exception in get_jetton_balance() from %s: %s",
+                            provider.name,
+                            task.exception(),
+                        )
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return {jetton_addr: -1 for jetton_addr in jetton_addrs}
+
+    def _maybe_cross_check(
+        self,
+        wallet: str,
+        jetton_addrs: tuple[str, ...],
+        provider: BalanceProvider,
+        balances: dict[str, int],
+    ) -> None:
+        if self.cross_check_rate <= 0 or random.random() >= self.cross_check_rate:
+            return
+        others = [
+            other
+            for other in self.providers
+            if other is not provider and other.available
+        ]
+        if not others:
+            return
+        task = asyncio.create_task(
+            self._cross_check(
+                wallet, jetton_addrs, provider, balances, random.choice(others)
+            )
+        )
+        self.cross_checks.add(task)
+        task.add_done_callback(self.cross_checks.discard)
+
+    async def _cross_check(
+        self,
+        wallet: str,
+        jetton_addrs: tuple[str, ...],
+        provider: BalanceProvider,
+        balances: dict[str, int],
+        other: BalanceProvider,
+    ) -> None:
         try:
-            jettons_balances = self.ton_api.accounts.get_jettons_balances(wallet)
+            other_balances = await other.get_jetton_balances(wallet, jetton_addrs)
         except Exception:
-            logging.error("Exception in get_jetton_balance()")
-            return -1
+            return
+        if other_balances != balances:
+            self.drifts += 1
+            BALANCE_DRIFTS.inc()
+            logging.error(
+                "Balance drift for %s: %s=%s, %s=%s",
+                wallet,
+                provider.name,
+                balances,
+                other.name,
+                other_balances,
+            )
 
-        for balance in jettons_balances.balances:
-            curr_jetton_addr = Address(balance.jetton.address()).to_str()
-            jetton_balance = int(balance.balance) / (10**balance.jetton.decimals)
+    async def get_jetton_balances(
+        self, wallet: str, jetton_addrs: tuple[str, ...], use_cache: bool = True
+    ) -> dict[str, int]:
+        """
+        Returns balances of the given jettons on a wallet, -1 if the lookup failed.
 
-            if curr_jetton_addr == jetton_addr:
-                return int(jetton_balance)
+        Concurrent lookups of the same wallet and jettons share one request.
+
+        :param wallet: Wallet address.
+        :param jetton_addrs: Jetton master addresses.
+        :param use_cache: Whether a recently fetched result may be returned,
+            the sweep disables it to always act on fresh balances.
+        """
+        key = (wallet, tuple(sorted(jetton_addrs)))
+        if use_cache and self.cache is not None and key in self.cache:
+            return dict(self.cache[key])
+
+        balances = await self.single_flight.do(
+            key, lambda: self._fetch_jetton_balances(wallet, key[1])
+        )
+        if self.cache is not None and min(balances.values(), default=0) >= 0:
+            self.cache[key] = balances
+        return dict(balances)
 
-        return 0
+    async def get_jetton_balance(
+        self, wallet: str, jetton_addr: str, use_cache: bool = True
+    ) -> int:
+        balances = await self.get_jetton_balances(wallet, (jetton_addr,), use_cache)
+        return balances[jetton_addr]
 
 
 class ListChecker:
@@ -48,12 +206,14 @@ class ListChecker:
             return username.lower() in ogs
         return False
 
-    def check_blacklist(self, username: str) -> bool:
+    def get_blacklist(self) -> set[str]:
         with open("blacklist.txt", "r") as file:
             blacklist = file.readlines()
-        blacklist = [line.strip().lower() for line in blacklist]
+        return {line.strip().lower() for line in blacklist}
+
+    def check_blacklist(self, username: str) -> bool:
         if username:
-            return username.lower() in blacklist
+            return username.lower() in self.get_blacklist()
         return False
 
 
@@ -94,36 +254,113 @@ class AdminNotifier:
             chat_id=self.settings.ADMIN_CHANNEL_ID, text=admin_message
         )
 
+    async def notify_shared_wallet(
+        self, user: UserSchema, other_users: list[UserSchema]
+    ):
+        """Warns admins that a wallet gates several accounts."""
+        others = ", ".join(f"@{other.username}" for other in other_users)
+        admin_message = (
+            f"👥 ОБЩИЙ КОШЕЛЕК \n\n"
+            f"Пользователь: @{user.username}\n"
+            f"Кошелек: {markdown.hcode(user.wallet)}\n"
+            f"Также подключен у: {others}\n"
+        )
+        await self.bot.send_message(
+            chat_id=self.settings.ADMIN_CHANNEL_ID, text=admin_message
+        )
+
 
 class DeDustHelper:
-    def __init__(self, provider: LiteBalancer) -> None:
+    """
+    Fetches jetton prices from DeDust.
+
+    Every refreshed price is stored as a sample in the prices table, which
+    history entries reference, and reused for cache_ttl seconds.
+    """
+
+    def __init__(
+        self,
+        provider: LiteBalancer,
+        uow: UnitOfWork,
+        breaker: Optional[CircuitBreaker] = None,
+        cache_ttl: float = 0,
+    ) -> None:
         self.provider = provider
+        self.uow = uow
+        self.breaker = breaker
+        self.cache = TTLCache(maxsize=16, ttl=cache_ttl) if cache_ttl > 0 else None
+        self.single_flight = SingleFlight()
+
+    async def get_price_sample(self, jetton_addr: str) -> Optional[PriceSchema]:
+        """
+        Returns the latest price sample of a jetton, None if the price is unknown.
 
-    async def get_jetton_price(self, jetton_addr: str):
-        await self.provider.start_up()
+        Concurrent refreshes of the same jetton share one DeDust request.
+        """
+        if self.cache is not None and jetton_addr in self.cache:
+            return self.cache[jetton_addr]
+        return await self.single_flight.do(
+            jetton_addr, lambda: self._refresh_price(jetton_addr)
+        )
+
+    async def _refresh_price(self, jetton_addr: str) -> Optional[PriceSchema]:
+        price = await self.fetch_jetton_price(jetton_addr)
+        # failed lookups are reported as 0, neither stored nor cached
+        if price <= 0:
+            return None
+        sample = await PricesService().add_price(
+            uow=self.uow, price=PriceSchemaAdd(jetton=jetton_addr, price=price)
+        )
+        if self.cache is not None:
+            self.cache[jetton_addr] = sample
+        return sample
+
+    async def get_jetton_price(self, jetton_addr: str) -> float:
+        """Returns the price of a jetton in TON, 0 if it couldn't be fetched."""
+        sample = await self.get_price_sample(jetton_addr)
+        return sample.price if sample is not None else 0
+
+    async def fetch_jetton_price(self, jetton_addr: str) -> float:
+        if self.breaker is not None and not self.breaker.allow():
+            logging.error("DeDust: 0 price, liteservers are unavailable")
+            return 0
+
+        # the connection is shared with the liteserver balance provider,
+        # keep it open between calls
+        await start_lite_balancer(self.provider)
 
         TON = Asset.native()
         WON = Asset.jetton(jetton_addr)
         while True:
             try:
-                pool = await Factory.get_pool(
-                    pool_type=PoolType.VOLATILE,
-                    assets=[TON, WON],
-                    provider=self.provider,
-                )
-                price = (
-                    await pool.get_estimated_swap_out(
-                        asset_in=WON, amount_in=int(1 * 1e9), provider=self.provider
+                async with observe_call("dedust", "get_jetton_price"):
+                    pool = await Factory.get_pool(
+                        pool_type=PoolType.VOLATILE,
+                        assets=[TON, WON],
+                        provider=self.provider,
                     )
-                )["amount_out"]
-                await self.provider.close_all()
+                    price = (
+                        await pool.get_estimated_swap_out(
+                            asset_in=WON,
+                            amount_in=int(1 * 1e9),
+                            provider=self.provider,
+                        )
+                    )["amount_out"]
+                if self.breaker is not None:
+                    self.breaker.record_success()
                 return price / 1e9
             except LiteServerError:
+                if self.breaker is not None:
+                    self.breaker.record_failure()
+                    if self.breaker.is_open:
+                        logging.error("DeDust: 0 price, liteservers are unavailable")
+                        return 0
                 await asyncio.sleep(1)
                 continue
             except Exception:
                 logging.error("DeDust: 0 price")
-                await self.provider.close_all()
+                if self.breaker is not None:
+                    self.breaker.record_failure()
                 return 0
 
 
@@ -137,6 +374,10 @@ class UtilMiddleware(BaseMiddleware):
         list_checker: ListChecker,
         admin_notifier: AdminNotifier,
         user_manager: UserManager,
+        invite_pool: InviteLinkPool,
+        connect_flight: SingleFlight,
+        breakers: list[CircuitBreaker],
+        tracer: Tracer,
     ) -> None:
         self.uow = uow
         self.settings = settings
@@ -145,6 +386,10 @@ class UtilMiddleware(BaseMiddleware):
         self.list_checker = list_checker
         self.admin_notifier = admin_notifier
         self.user_manager = user_manager
+        self.invite_pool = invite_pool
+        self.connect_flight = connect_flight
+        self.breakers = breakers
+        self.tracer = tracer
 
     async def __call__(
         self,
@@ -159,4 +404,8 @@ class UtilMiddleware(BaseMiddleware):
         data["list_checker"] = self.list_checker
         data["admin_notifier"] = self.admin_notifier
         data["user_manager"] = self.user_manager
+        data["invite_pool"] = self.invite_pool
+        data["connect_flight"] = self.connect_flight
+        data["breakers"] = self.breakers
+        data["tracer"] = self.tracer
         return await handler(event, data)
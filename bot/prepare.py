@@ -1,14 +1,35 @@
+import json
 import logging
+import urllib.request
+from functools import cached_property
+from typing import Optional
+
 from aiogram import Bot
 from aiogram.client.bot import DefaultBotProperties
 from aiogram.enums import ParseMode
 
 
 from pytonapi import Tonapi
+from pytonapi.exceptions import TONAPIBadRequestError, TONAPINotFoundError
 from pytoniq import LiteBalancer
+from pytoniq.liteclient import RunGetMethodError
+from redis.asyncio import Redis
 
+from bot.utils.balance_providers import (
+    BalanceProvider,
+    LiteServerBalanceProvider,
+    TonApiBalanceProvider,
+    ToncenterBalanceProvider,
+)
+from bot.utils.circuit_breaker import CircuitBreaker, TelegramBreakerMiddleware
+from bot.utils.hysteresis import FlipGuard
+from bot.utils.metrics import TelegramMetricsMiddleware
+from bot.utils.invite_pool import InviteLinkPool
+from bot.utils.outbox import OutboxDispatcher
+from bot.utils.singleflight import RedisSingleFlight, SingleFlight
 from bot.utils.user_manager import UserManager
 
+from .middlewares.tracing import Tracer
 from .middlewares.util_middleware import (
     AdminNotifier,
     UtilMiddleware,
@@ -16,41 +37,232 @@ from .middlewares.util_middleware import (
     DeDustHelper,
     ListChecker,
 )
-from bot.config import settings
+from bot.config import Settings, get_settings
 from bot.db.utils.unitofwork import UnitOfWork
 
 # List of wallets to exclude
 EXCLUDE_WALLETS = []
 
-print("-----BOT STARTED-----")
+LITESERVER_CONFIG_URL = "https://ton.org/global-config.json"
 
-bot = Bot(settings.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-provider = LiteBalancer.from_mainnet_config(1)
 
-logging.basicConfig(
-    level=logging.ERROR,
-    format="%(asctime)s %(levelname)s %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
+def setup_logging():
+    logging.basicConfig(
+        level=logging.ERROR,
+        format="%(asctime)s %(levelname)s %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    # sampled traces are logged at info level
+    logging.getLogger("bot.middlewares.tracing").setLevel(logging.INFO)
 
 
-def setup_util_middleware() -> UtilMiddleware:
-    uow = UnitOfWork()
-    ton_api = Tonapi(settings.TON_API_KEY)
-    ton_api_helper = TonApiHelper(ton_api=ton_api)
-    dedust_helper = DeDustHelper(provider=provider)
-    list_checker = ListChecker()
-    admin_notifier = AdminNotifier(bot=bot, settings=settings)
-    user_manager = UserManager(bot=bot, admin_notifier=admin_notifier, uow=uow)
-    return UtilMiddleware(
-        ton_api_helper=ton_api_helper,
-        dedust_helper=dedust_helper,
-        uow=uow,
-        settings=settings,
-        list_checker=list_checker,
-        admin_notifier=admin_notifier,
-        user_manager=user_manager,
-    )
+class App:
+    """
+    Application factory.
+
+    Every component is built on first access together with the components
+    it depends on, so an entry point only pays for what it uses: the dry
+    run never creates the Bot, the sweep never touches the liteservers
+    unless a liteserver provider is configured, migrations never get here.
+    A component may be replaced by assigning it before it is first used.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None) -> None:
+        self.settings = settings or get_settings()
+
+    def _breaker(self, name: str, **kwargs) -> CircuitBreaker:
+        return CircuitBreaker(
+            name=name,
+            failure_threshold=self.settings.BREAKER_FAILURE_THRESHOLD,
+            recovery_timeout=self.settings.BREAKER_RECOVERY_TIMEOUT,
+            **kwargs,
+        )
+
+    @cached_property
+    def tonapi_breaker(self) -> CircuitBreaker:
+        # unknown wallets and bad addresses are not TonAPI failures
+        return self._breaker(
+            "tonapi", ignore=(TONAPINotFoundError, TONAPIBadRequestError)
+        )
+
+    @cached_property
+    def toncenter_breaker(self) -> CircuitBreaker:
+        return self._breaker("toncenter")
+
+    @cached_property
+    def liteserver_breaker(self) -> CircuitBreaker:
+        return self._breaker("liteserver", ignore=(RunGetMethodError,))
+
+    @cached_property
+    def telegram_breaker(self) -> CircuitBreaker:
+        return self._breaker("telegram")
+
+    @cached_property
+    def breakers(self) -> list[CircuitBreaker]:
+        return [
+            self.tonapi_breaker,
+            self.toncenter_breaker,
+            self.liteserver_breaker,
+            self.telegram_breaker,
+        ]
+
+    @cached_property
+    def bot(self) -> Bot:
+        bot = Bot(
+            self.settings.BOT_TOKEN,
+            default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+        )
+        bot.session.middleware(TelegramMetricsMiddleware())
+        bot.session.middleware(TelegramBreakerMiddleware(self.telegram_breaker))
+        return bot
+
+    @cached_property
+    def lite_balancer(self) -> LiteBalancer:
+        # downloads the mainnet config, LiteBalancer.from_mainnet_config() has
+        # no timeout; the warm-up builds it off the event loop
+        with urllib.request.urlopen(
+            LITESERVER_CONFIG_URL, timeout=self.settings.LITESERVER_CONFIG_TIMEOUT
+        ) as response:
+            config = json.load(response)
+        return LiteBalancer.from_config(config, trust_level=1)
+
+    @cached_property
+    def tracer(self) -> Tracer:
+        return Tracer(
+            sample_rate=self.settings.TRACE_SAMPLE_RATE,
+            slow_budget=self.settings.SLOW_UPDATE_BUDGET,
+        )
+
+    @cached_property
+    def uow(self) -> UnitOfWork:
+        return UnitOfWork()
+
+    def _balance_provider(self, name: str) -> BalanceProvider:
+        if name == "tonapi":
+            return TonApiBalanceProvider(
+                ton_api=Tonapi(self.settings.TON_API_KEY),
+                breaker=self.tonapi_breaker,
+            )
+        if name == "toncenter":
+            return ToncenterBalanceProvider(
+                api_key=self.settings.TONCENTER_API_KEY,
+                url=self.settings.TONCENTER_URL,
+                decimals=self.settings.JETTON_DECIMALS,
+                breaker=self.toncenter_breaker,
+            )
+        if name == "liteserver":
+            return LiteServerBalanceProvider(
+                provider=self.lite_balancer,
+                decimals=self.settings.JETTON_DECIMALS,
+                breaker=self.liteserver_breaker,
+            )
+        raise ValueError(f"Unknown balance provider: {name}")
+
+    @cached_property
+    def ton_api_helper(self) -> TonApiHelper:
+        return TonApiHelper(
+            providers=[
+                self._balance_provider(name) for name in self.settings.BALANCE_PROVIDERS
+            ],
+            cache_ttl=self.settings.BALANCE_CACHE_TTL,
+            hedge_delay=self.settings.BALANCE_HEDGE_DELAY,
+            min_hedge_delay=self.settings.BALANCE_MIN_HEDGE_DELAY,
+            cross_check_rate=self.settings.BALANCE_CROSS_CHECK_RATE,
+        )
+
+    @cached_property
+    def dedust_helper(self) -> DeDustHelper:
+        return DeDustHelper(
+            provider=self.lite_balancer,
+            uow=self.uow,
+            breaker=self.liteserver_breaker,
+            cache_ttl=self.settings.PRICE_CACHE_TTL,
+        )
+
+    @cached_property
+    def list_checker(self) -> ListChecker:
+        return ListChecker()
+
+    @cached_property
+    def admin_notifier(self) -> AdminNotifier:
+        return AdminNotifier(bot=self.bot, settings=self.settings)
+
+    @cached_property
+    def invite_pool(self) -> InviteLinkPool:
+        return InviteLinkPool(
+            bot=self.bot,
+            chat_ids=[self.settings.CHAT_ID, self.settings.CHANNEL_ID],
+            size=self.settings.INVITE_POOL_SIZE,
+            ttl=self.settings.INVITE_LINK_TTL,
+            min_ttl=self.settings.INVITE_LINK_MIN_TTL,
+        )
+
+    @cached_property
+    def connect_flight(self) -> SingleFlight:
+        if self.settings.CONNECT_LOCK_REDIS:
+            # replicas share the guard so a user is served by one of them at a time
+            return RedisSingleFlight(
+                redis=Redis.from_url(self.settings.REDIS_DSN),
+                prefix="connect",
+                ttl=self.settings.CONNECT_LOCK_TTL,
+            )
+        return SingleFlight()
+
+    @cached_property
+    def user_manager(self) -> UserManager:
+        return UserManager(
+            bot=self.bot,
+            admin_notifier=self.admin_notifier,
+            uow=self.uow,
+            invite_pool=self.invite_pool,
+        )
+
+    @cached_property
+    def util_middleware(self) -> UtilMiddleware:
+        return UtilMiddleware(
+            ton_api_helper=self.ton_api_helper,
+            dedust_helper=self.dedust_helper,
+            uow=self.uow,
+            settings=self.settings,
+            list_checker=self.list_checker,
+            admin_notifier=self.admin_notifier,
+            user_manager=self.user_manager,
+            invite_pool=self.invite_pool,
+            connect_flight=self.connect_flight,
+            breakers=self.breakers,
+            tracer=self.tracer,
+        )
+
+    @cached_property
+    def outbox_dispatcher(self) -> OutboxDispatcher:
+        return OutboxDispatcher(
+            bot=self.bot,
+            uow=self.uow,
+            user_manager=self.user_manager,
+            admin_notifier=self.admin_notifier,
+            batch_size=self.settings.OUTBOX_BATCH_SIZE,
+            lease=self.settings.OUTBOX_LEASE,
+            max_attempts=self.settings.OUTBOX_MAX_ATTEMPTS,
+            retry_delay=self.settings.OUTBOX_RETRY_DELAY,
+        )
+
+    @cached_property
+    def flip_guard(self) -> FlipGuard:
+        return FlipGuard(confirmations=self.settings.FLIP_CONFIRMATIONS)
+
+
+_app: Optional[App] = None
+
+
+def get_app() -> App:
+    """Returns the application of the process, creating it on first use."""
+    global _app
+    if _app is None:
+        _app = App()
+    return _app
 
 
-util_middleware = setup_util_middleware()
+def set_app(app: App) -> None:
+    """Installs the application returned by get_app(), e.g. one with stand-ins."""
+    global _app
+    _app = app
@@ -1,5 +1,8 @@
 import asyncio
 import logging
+import time
+from collections import Counter
+from typing import Optional
 
 from aiogram.exceptions import TelegramAPIError
 from aiogram.utils import markdown
@@ -8,125 +11,317 @@ from pytoniq.liteclient import LiteServerError
 
 from bot.config import settings
 from bot.db.schemas.schema_history import HistorySchemaAdd
+from bot.db.schemas.schema_prices import PriceSchema
+from bot.db.schemas.schema_sweeps import SweepSchema
 from bot.db.schemas.schema_users import UserSchema
+from bot.db.services.service_history import HistoryService
+from bot.db.services.service_stats import StatsService
+from bot.db.services.service_sweeps import SweepsService
 from bot.db.services.service_users import UsersService
 from bot.db.utils.unitofwork import UnitOfWork
 from bot.keyboards import kb_buy_won
-from bot.prepare import bot, util_middleware
+from bot.prepare import get_app
+from bot.utils.circuit_breaker import CircuitOpenError
+from bot.utils.decisions import (
+    BAN,
+    BLACKLIST,
+    BUY,
+    SELL,
+    SKIP,
+    UNBAN,
+    count_actions,
+    decide_actions,
+    guard_action,
+)
+from bot.utils.metrics import (
+    SWEEP_ACTIONS,
+    SWEEP_DEFERRED,
+    SWEEP_DURATION,
+    SWEEP_USERS,
+)
+from bot.utils.outbox import (
+    OutboxDispatcher,
+    notify_admin_entry,
+    send_message_entry,
+)
 from bot.utils.user_manager import UserManager
 
 from .middlewares.util_middleware import (
-    AdminNotifier,
     DeDustHelper,
     ListChecker,
     TonApiHelper,
 )
 
 
-async def task_update_users():
-    uow: UnitOfWork = util_middleware.uow
-    ton_api_helper: TonApiHelper = util_middleware.ton_api_helper
-    dedust_helper: DeDustHelper = util_middleware.dedust_helper
-    list_checker: ListChecker = util_middleware.list_checker
-    admin_notifier: AdminNotifier = util_middleware.admin_notifier
-    user_manager: UserManager = util_middleware.user_manager
+async def fetch_balances(
+    users: list[UserSchema],
+    blacklist: set[str],
+    shared_balances: Optional[dict[str, Optional[int]]] = None,
+) -> list[int]:
+    """Fetches WON + WON LP balances, -1 if a user's balance couldn't be fetched.
 
-    try:
-        users: list[UserSchema] = await UsersService().get_users(uow=uow)
-        counter = 0
-
-        price = await dedust_helper.get_jetton_price(settings.WON_ADDR)
-
-        for user in users:
-            is_blacklisted = list_checker.check_blacklist(user.username)
-            if user.blacklisted:
-                continue
-            if is_blacklisted:
-                user.blacklisted = True
-                user = await user_manager.revoke_user_invite_links(user)
-                await user_manager.ban_user(
-                    user=user,
-                    history_entry=HistorySchemaAdd(
-                        user_id=user.id, balance_delta=0, price=0, wallet=user.wallet
-                    ),
-                    notification_type="blacklist",
+    Blacklisted users are not looked up, their stored balance is returned.
+    Raises CircuitOpenError as soon as all balance providers are considered down.
+
+    :param shared_balances: Wallet -> balance of the wallets connected by
+        several users, None until fetched. Such a wallet is looked up once.
+    """
+    ton_api_helper: TonApiHelper = get_app().ton_api_helper
+
+    balances = []
+    counter = 0
+    for user in users:
+        if user.blacklisted or is_listed(user, blacklist):
+            balances.append(user.balance)
+            continue
+        if shared_balances and shared_balances.get(user.wallet) is not None:
+            balances.append(shared_balances[user.wallet])
+            continue
+        if not ton_api_helper.available:
+            raise CircuitOpenError("balance providers")
+
+        # bans depend on this balance, never serve it from the cache
+        jetton_balances = await ton_api_helper.get_jetton_balances(
+            user.wallet, (settings.WON_ADDR, settings.WON_LP_ADDR), use_cache=False
+        )
+        if min(jetton_balances.values()) < 0:
+            balances.append(-1)
+        else:
+            balances.append(sum(jetton_balances.values()))
+            if shared_balances and user.wallet in shared_balances:
+                shared_balances[user.wallet] = balances[-1]
+
+        counter = counter + 1
+        if counter % 99 == 0:
+            # to avoid TonApi rate limit
+            await asyncio.sleep(settings.SWEEP_RATE_LIMIT_PAUSE)
+    return balances
+
+
+def find_shared_wallets(users: list[UserSchema]) -> dict[str, Optional[int]]:
+    """Returns wallets connected by several users, mapped to None."""
+    wallets = Counter(user.wallet for user in users)
+    return {wallet: None for wallet, count in wallets.items() if count > 1}
+
+
+def is_listed(user: UserSchema, blacklist: set[str]) -> bool:
+    return bool(user.username) and user.username.lower() in blacklist
+
+
+def plan_actions(
+    users: list[UserSchema], balances: list[int], blacklist: set[str]
+) -> list[Optional[str]]:
+    return decide_actions(
+        balances=balances,
+        stored_balances=[user.balance for user in users],
+        og=[user.og for user in users],
+        banned=[user.banned for user in users],
+        blacklisted=[user.blacklisted for user in users],
+        listed=[is_listed(user, blacklist) for user in users],
+        threshold=settings.THRESHOLD_BALANCE,
+        og_threshold=settings.OG_THRESHOLD_BALANCE,
+        band=settings.HYSTERESIS_BAND,
+    )
+
+
+async def apply_action(
+    user: UserSchema,
+    action: Optional[str],
+    won_balance: int,
+    price_sample: Optional[PriceSchema],
+    sweep: SweepSchema,
+):
+    """Applies a planned action to a user.
+
+    Telegram side effects are written to the outbox together with the user's
+    new state and performed later by the outbox dispatcher.
+    """
+    uow: UnitOfWork = get_app().uow
+    user_manager: UserManager = get_app().user_manager
+
+    # idempotency key prefix of the outbox entries
+    key = f"sweep:{sweep.id}:user:{user.id}"
+
+    if action == BLACKLIST:
+        user.blacklisted = True
+        await user_manager.enqueue_ban(
+            user=user,
+            history_entry=HistorySchemaAdd(
+                user_id=user.id, balance_delta=0, wallet=user.wallet
+            ),
+            key=key,
+            notification_type="blacklist",
+        )
+        return
+
+    # don't ban/unban wallets hovering around the threshold on every sweep
+    action, suppressed = guard_action(
+        action, get_app().flip_guard, user.id, won_balance, user.balance
+    )
+    if suppressed:
+        sweep.flips_suppressed += 1
+    if action is None:
+        return
+
+    balance_delta = won_balance - user.balance
+    history_entry = HistorySchemaAdd(
+        user_id=user.id,
+        balance_delta=balance_delta,
+        price_id=price_sample.id if price_sample is not None else None,
+        wallet=user.wallet,
+    )
+
+    if user.og:
+        threshold_balance = settings.OG_THRESHOLD_BALANCE
+    else:
+        threshold_balance = settings.THRESHOLD_BALANCE
+
+    # user has low balance and not banned? ban and notify both users and admins
+    if action == BAN:
+        user.balance = won_balance
+        sweep.bans += 1
+        logging.error("USER: %s, balance: %s", user.username, won_balance)
+
+        message_text = (
+            f"Мало WON на кошельке {markdown.hcode(user.wallet)}\n\n"
+            f"Убрали вас из коммьюнити.\n\n"
+            f"Пополните баланс чтобы вернуться. Надо не меньше {markdown.hcode(str(threshold_balance))} WON"
+        )
+        price = price_sample.price if price_sample is not None else 0
+        reply_markup = await kb_buy_won(settings=settings, price=price)
+        await user_manager.enqueue_ban(
+            user=user,
+            history_entry=history_entry,
+            key=key,
+            outbox_entries=[
+                send_message_entry(
+                    key,
+                    user.tg_user_id,
+                    message_text,
+                    reply_markup,
+                    banned_user_id=user.id,
                 )
-                continue
+            ],
+        )
+    # user is banned and has enough balance? unban and notify both user and admins
+    elif action == UNBAN:
+        user.balance = won_balance
+        sweep.unbans += 1
+        await user_manager.enqueue_unban(
+            user=user, history_entry=history_entry, key=key
+        )
+    # user is not banned but balance changed? send buy/sell notification to admins
+    elif action in (BUY, SELL):
+        user.balance = won_balance
+        await UsersService().edit_user(
+            uow=uow,
+            user_id=user.id,
+            user=user,
+            history_entry=history_entry,
+            outbox_entries=[notify_admin_entry(key, action, user, sum_=balance_delta)],
+        )
 
-            won_lp_balance = await ton_api_helper.get_jetton_balance(
-                user.wallet, settings.WON_LP_ADDR
-            )
-            won_balance = await ton_api_helper.get_jetton_balance(
-                user.wallet, settings.WON_ADDR
-            )
 
-            if won_balance < 0 or won_lp_balance < 0:
-                continue
+async def task_reap_invite_links():
+    user_manager: UserManager = get_app().user_manager
+
+    try:
+        await user_manager.reap_invite_links(
+            batch_size=settings.INVITE_REAPER_BATCH_SIZE
+        )
+    except Exception as e:
+        logging.exception("Exception in task_reap_invite_links(): %s", e)
 
-            won_balance += won_lp_balance
-            balance_delta = won_balance - user.balance
 
-            if user.og:
-                threshold_balance = settings.OG_THRESHOLD_BALANCE
-            else:
-                threshold_balance = settings.THRESHOLD_BALANCE
+async def task_maintain_history():
+    uow: UnitOfWork = get_app().uow
 
-            history_entry = HistorySchemaAdd(
-                user_id=user.id,
-                balance_delta=balance_delta,
-                price=price,
-                wallet=user.wallet,
+    try:
+        retired = await HistoryService().maintain_partitions(
+            uow=uow,
+            months_ahead=settings.HISTORY_PARTITIONS_AHEAD,
+            retention_months=settings.HISTORY_RETENTION_MONTHS,
+            archive=settings.HISTORY_ARCHIVE,
+        )
+        if retired:
+            logging.error(
+                "%s history partitions older than HISTORY_RETENTION_MONTHS=%s: %s",
+                "Archived" if settings.HISTORY_ARCHIVE else "Dropped",
+                settings.HISTORY_RETENTION_MONTHS,
+                ", ".join(retired),
             )
+    except Exception as e:
+        logging.exception("Exception in task_maintain_history(): %s", e)
 
-            # user has low balance and not banned? ban and notify both users and admins
-            if won_balance < threshold_balance and not user.banned:
-                user.balance = won_balance
-                logging.error("USER: %s, balance: %s", user.username, won_balance)
-                user = await user_manager.ban_user(
-                    user=user, history_entry=history_entry
-                )
 
-                message_text = (
-                    f"Мало WON на кошельке {markdown.hcode(user.wallet)}\n\n"
-                    f"Убрали вас из коммьюнити.\n\n"
-                    f"Пополните баланс чтобы вернуться. Надо не меньше {markdown.hcode(str(threshold_balance))} WON"
-                )
-                reply_markup = await kb_buy_won(settings=settings, price=price)
-                await bot.send_message(
-                    chat_id=user.tg_user_id,
-                    text=message_text,
-                    reply_markup=reply_markup,
-                )
-            # user is banned and has enough balance? unban and notify both user and admins
-            elif user.banned and won_balance >= threshold_balance:
-                user.balance = won_balance
-                user = await user_manager.unban_user(
-                    user=user, history_entry=history_entry
-                )
+async def task_dispatch_outbox():
+    outbox_dispatcher: OutboxDispatcher = get_app().outbox_dispatcher
 
-                message_text = (
-                    f"Кошелек {markdown.hcode(user.wallet)} пополнен, вы можете вернуться в коммьюнити!\n\n"
-                    f"Ссылка для вступления в чат: {user.invite_link}\n\n"
-                    f"Ссылка для подписки на канал: {user.channel_invite_link}"
-                )
-                await bot.send_message(chat_id=user.tg_user_id, text=message_text)
-            # user is not banned but balance changed? send buy/sell notification to admins
-            elif won_balance != user.balance and not user.banned:
-                buy_sell = "buy" if balance_delta > 0 else "sell"
-                user.balance = won_balance
-                await admin_notifier.notify_admin(
-                    type_=buy_sell, user=user, sum_=balance_delta
-                )
-                await UsersService().edit_user(
-                    uow=uow, user_id=user.id, user=user, history_entry=history_entry
-                )
-            # user is not banned and has enough balance? revoke old invite links
-            elif not user.banned and won_balance >= threshold_balance:
-                await user_manager.revoke_old_user_invite_links(user)
+    try:
+        # keep draining while full batches come back
+        while await outbox_dispatcher.dispatch() >= settings.OUTBOX_BATCH_SIZE:
+            pass
+    except Exception as e:
+        logging.exception("Exception in task_dispatch_outbox(): %s", e)
 
-            counter = counter + 1
-            if counter % 99 == 0:
-                await asyncio.sleep(1)  # to avoid TonApi rate limit
+
+async def task_update_users():
+    uow: UnitOfWork = get_app().uow
+    dedust_helper: DeDustHelper = get_app().dedust_helper
+    list_checker: ListChecker = get_app().list_checker
+    ton_api_helper: TonApiHelper = get_app().ton_api_helper
+
+    if not ton_api_helper.available:
+        logging.error("Balance providers are unavailable, sweep deferred")
+        SWEEP_DEFERRED.inc()
+        return
+
+    started = time.monotonic()
+    try:
+        # resume from the checkpoint if the previous sweep was interrupted
+        sweep: SweepSchema = await SweepsService().start_sweep(uow=uow)
+        users: list[UserSchema] = await UsersService().get_users(
+            uow=uow, after_id=sweep.last_user_id
+        )
+        blacklist = list_checker.get_blacklist()
+        # a wallet shared by several accounts is looked up once per sweep
+        shared_balances = find_shared_wallets(users)
+
+        price_sample = await dedust_helper.get_price_sample(settings.WON_ADDR)
+
+        for i in range(0, len(users), settings.SWEEP_CHECKPOINT_INTERVAL):
+            batch = users[i : i + settings.SWEEP_CHECKPOINT_INTERVAL]
+            balances = await fetch_balances(batch, blacklist, shared_balances)
+            actions = plan_actions(batch, balances, blacklist)
+
+            checked_user_ids = []
+            for user, action, won_balance in zip(batch, actions, balances):
+                if action == SKIP:
+                    sweep.users_skipped += 1
+                    SWEEP_USERS.labels("skipped").inc()
+                else:
+                    await apply_action(user, action, won_balance, price_sample, sweep)
+                    sweep.users_processed += 1
+                    SWEEP_USERS.labels("processed").inc()
+                    if action is not None:
+                        SWEEP_ACTIONS.labels(action).inc()
+                    checked_user_ids.append(user.id)
+                sweep.last_user_id = user.id
+
+            await SweepsService().checkpoint(
+                uow=uow, sweep=sweep, checked_user_ids=checked_user_ids
+            )
+
+        await SweepsService().checkpoint(
+            uow=uow, sweep=sweep, checked_user_ids=[], finished=True
+        )
+        SWEEP_DURATION.observe(time.monotonic() - started)
+        # admin /stats are served from views rebuilt once per sweep
+        await StatsService().refresh(uow=uow)
+    except CircuitOpenError as e:
+        # the sweep stays unfinished and resumes from the last checkpoint
+        logging.error("Sweep deferred: %s", e)
+        SWEEP_DEFERRED.inc()
     except LiteServerError:
         pass
     except TONAPIError:
@@ -142,3 +337,24 @@ async def task_update_users():
         )
     except Exception as e:
         logging.exception("Exception in task_update_users(): %s", e)
+
+
+async def print_sweep_plan():
+    """Prints what a sweep would do right now without any side effects."""
+    uow: UnitOfWork = get_app().uow
+    list_checker: ListChecker = get_app().list_checker
+
+    users = await UsersService().get_users(uow=uow)
+    blacklist = list_checker.get_blacklist()
+    balances = await fetch_balances(users, blacklist, find_shared_wallets(users))
+    actions = plan_actions(users, balances, blacklist)
+
+    print(f"Users: {len(users)}")
+    for action, count in count_actions(actions).most_common():
+        print(f"{action}: {count}")
+    for user, action, balance in zip(users, actions, balances):
+        if action is not None:
+            print(
+                f"{action}\t@{user.username}\t{user.tg_user_id}\t"
+                f"{user.wallet}\t{user.balance} -> {balance}"
+            )
@@ -0,0 +1,250 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Optional
+
+from aiohttp import ClientSession, ClientTimeout
+from pytonapi import Tonapi
+from pytoniq import LiteBalancer
+from pytoniq.liteclient import RunGetMethodError
+from pytoniq_core import Address, begin_cell
+
+from bot.utils.circuit_breaker import CircuitBreaker
+from bot.utils.metrics import observe_call
+
+_lite_balancer_lock = asyncio.Lock()
+
+
+async def start_lite_balancer(provider: LiteBalancer) -> None:
+    """Connects a shared liteserver balancer unless already connected."""
+    async with _lite_balancer_lock:
+        if not provider.inited:
+            await provider.start_up()
+
+
+class BalanceProvider(ABC):
+    """
+    Source of jetton balances.
+
+    Implementations raise on failure, whole jetton units are returned.
+    """
+
+    name: str
+
+    def __init__(self, breaker: Optional[CircuitBreaker] = None) -> None:
+        """
+        :param breaker: Circuit breaker of the provider's backend.
+        """
+        self.breaker = breaker
+        self.latency = LatencyTracker()
+
+    @property
+    def available(self) -> bool:
+        return self.breaker is None or not self.breaker.is_open
+
+    async def get_jetton_balances(
+        self, wallet: str, jetton_addrs: tuple[str, ...]
+    ) -> dict[str, int]:
+        """
+        Returns balances of the given jettons on a wallet.
+
+        Goes through the circuit breaker and records the latency of
+        successful and hedged-out lookups.
+        """
+        started = time.monotonic()
+        try:
+            async with observe_call(self.name, "get_jetton_balances"):
+                if self.breaker is not None:
+                    balances = await self.breaker.call(
+                        self._get_jetton_balances, wallet, jetton_addrs
+                    )
+                else:
+                    balances = await self._get_jetton_balances(wallet, jetton_addrs)
+        except asyncio.CancelledError:
+            # lost to a hedged request, it took at least this long
+            self.latency.observe(time.monotonic() - started)
+            raise
+        self.latency.observe(time.monotonic() - started)
+        return balances
+
+    async def warm_up(self) -> None:
+        """Connects to the backend ahead of the first lookup."""
+
+    @abstractmethod
+    async def _get_jetton_balances(
+        self, wallet: str, jetton_addrs: tuple[str, ...]
+    ) -> dict[str, int]:
+        raise NotImplementedError
+
+
+class TonApiBalanceProvider(BalanceProvider):
+    name = "tonapi"
+
+    def __init__(
+        self, ton_api: Tonapi, breaker: Optional[CircuitBreaker] = None
+    ) -> None:
+        super().__init__(breaker)
+        self.ton_api = ton_api
+
+    async def warm_up(self) -> None:
+        # the client opens a connection per request, this resolves the host
+        # and checks the key
+        async with observe_call(self.name, "status"):
+            await asyncio.to_thread(self.ton_api.utilities.status)
+
+    async def _get_jetton_balances(
+        self, wallet: str, jetton_addrs: tuple[str, ...]
+    ) -> dict[str, int]:
+        # the client is synchronous, keep it off the event loop
+        jettons_balances = await asyncio.to_thread(
+            self.ton_api.accounts.get_jettons_balances, wallet
+        )
+
+        balances = {jetton_addr: 0 for jetton_addr in jetton_addrs}
+        for balance in jettons_balances.balances:
+            curr_jetton_addr = Address(balance.jetton.address()).to_str()
+            jetton_balance = int(balance.balance) / (10**balance.jetton.decimals)
+
+            if curr_jetton_addr in balances:
+                balances[curr_jetton_addr] = int(jetton_balance)
+
+        return balances
+
+
+class ToncenterBalanceProvider(BalanceProvider):
+    name = "toncenter"
+
+    def __init__(
+        self,
+        api_key: str,
+        url: str = "https://toncenter.com/api/v3",
+        decimals: int = 9,
+        timeout: float = 10,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        """
+        :param api_key: Toncenter API key, may be empty.
+        :param url: Base URL of the v3 API.
+        :param decimals: Decimals of the jettons.
+        :param timeout: Request timeout in seconds.
+        :param breaker: Circuit breaker of Toncenter.
+        """
+        super().__init__(breaker)
+        self.api_key = api_key
+        self.url = url
+        self.decimals = decimals
+        self.timeout = timeout
+        self._session: Optional[ClientSession] = None
+
+    @property
+    def session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            headers = {"X-API-Key": self.api_key} if self.api_key else {}
+            self._session = ClientSession(
+                headers=headers, timeout=ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def warm_up(self) -> None:
+        async with observe_call(self.name, "masterchain_info"):
+            async with self.session.get(f"{self.url}/masterchainInfo") as response:
+                response.raise_for_status()
+
+    async def _get_jetton_balances(
+        self, wallet: str, jetton_addrs: tuple[str, ...]
+    ) -> dict[str, int]:
+        async with self.session.get(
+            f"{self.url}/jetton/wallets",
+            params={"owner_address": wallet, "limit": 256},
+        ) as response:
+            response.raise_for_status()
+            data = await response.json()
+
+        balances = {jetton_addr: 0 for jetton_addr in jetton_addrs}
+        for jetton_wallet in data["jetton_wallets"]:
+            # toncenter returns raw addresses
+            curr_jetton_addr = Address(jetton_wallet["jetton"]).to_str()
+            if curr_jetton_addr in balances:
+                balances[curr_jetton_addr] = int(
+                    int(jetton_wallet["balance"]) / (10**self.decimals)
+                )
+
+        return balances
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+class LiteServerBalanceProvider(BalanceProvider):
+    name = "liteserver"
+
+    def __init__(
+        self,
+        provider: LiteBalancer,
+        decimals: int = 9,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        """
+        :param provider: Liteserver balancer, shared with the DeDust helper.
+        :param decimals: Decimals of the jettons.
+        :param breaker: Circuit breaker of the liteservers.
+        """
+        super().__init__(breaker)
+        self.provider = provider
+        self.decimals = decimals
+
+    async def warm_up(self) -> None:
+        await start_lite_balancer(self.provider)
+
+    async def _get_jetton_balance(self, owner: Address, jetton_addr: str) -> int:
+        result = await self.provider.run_get_method(
+            jetton_addr,
+            "get_wallet_address",
+            [begin_cell().store_address(owner).end_cell().begin_parse()],
+        )
+        jetton_wallet = result[0].load_address()
+        try:
+            result = await self.provider.run_get_method(
+                jetton_wallet, "get_wallet_data", []
+            )
+        except RunGetMethodError:
+            # the jetton wallet is not deployed yet
+            return 0
+        return int(result[0] / (10**self.decimals))
+
+    async def _get_jetton_balances(
+        self, wallet: str, jetton_addrs: tuple[str, ...]
+    ) -> dict[str, int]:
+        await start_lite_balancer(self.provider)
+        owner = Address(wallet)
+        balances = await asyncio.gather(
+            *(
+                self._get_jetton_balance(owner, jetton_addr)
+                for jetton_addr in jetton_addrs
+            )
+        )
+        return dict(zip(jetton_addrs, balances))
+
+
+class LatencyTracker:
+    """Keeps recent latencies of a provider to derive the hedging delay."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20) -> None:
+        """
+        :param window: Number of recent latencies kept.
+        :param min_samples: Samples required before percentiles are trusted.
+        """
+        self.samples: deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def observe(self, latency: float) -> None:
+        self.samples.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Returns the q-th percentile of recent latencies, None if unknown."""
+        if len(self.samples) < self.min_samples:
+            return None
+        samples = sorted(self.samples)
+        return samples[min(int(len(samples) * q), len(samples) - 1)]
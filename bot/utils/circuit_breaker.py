@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional, Type
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramNetworkError, TelegramServerError
+from aiogram.methods import GetUpdates, TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+    def __init__(self, name: str) -> None:
+        super().__init__(f"Circuit breaker {name} is open")
+        self.name = name
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency for a while.
+
+    The breaker opens after `failure_threshold` consecutive failures and
+    fails fast for `recovery_timeout` seconds. Then it lets `half_open_max`
+    probe calls through: a successful probe closes it, a failed one opens
+    it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        recovery_timeout: float,
+        half_open_max: int = 1,
+        ignore: tuple[Type[BaseException], ...] = (),
+    ) -> None:
+        """
+        :param name: Name of the dependency, used in logs and the admin status.
+        :param failure_threshold: Consecutive failures that open the breaker.
+        :param recovery_timeout: Seconds to stay open before probing.
+        :param half_open_max: Concurrent probe calls allowed while half-open.
+        :param ignore: Exceptions that are not failures of the dependency,
+            e.g. client errors.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max = half_open_max
+        self.ignore = ignore
+
+        self._state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if (
+            self._state == OPEN
+            and time.monotonic() - self.opened_at >= self.recovery_timeout
+        ):
+            self._state = HALF_OPEN
+            self.probes = 0
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """Tells whether calls are rejected right now, without taking a probe."""
+        return self.state == OPEN
+
+    def allow(self) -> bool:
+        """Tells whether a call may be made, taking a probe slot if half-open."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self.probes < self.half_open_max:
+            self.probes += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        if self._state != CLOSED:
+            logging.error("Circuit breaker %s closed", self.name)
+        self._state = CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self._state != OPEN:
+                self.trips += 1
+                logging.error(
+                    "Circuit breaker %s opened after %s failures",
+                    self.name,
+                    self.failures,
+                )
+            self._state = OPEN
+            self.opened_at = time.monotonic()
+
+    def record(self, exc: Optional[BaseException]) -> None:
+        """Records the outcome of a call, ignored exceptions count as success."""
+        if exc is None or isinstance(exc, self.ignore):
+            self.record_success()
+        else:
+            self.record_failure()
+
+    async def call(self, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Calls `fn` through the breaker.
+
+        :raises CircuitOpenError: If the breaker is open.
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            # no outcome, give the probe slot back
+            self.probes = max(self.probes - 1, 0)
+            raise
+        except Exception as e:
+            self.record(e)
+            raise
+        self.record(None)
+        return result
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+class TelegramBreakerMiddleware(BaseRequestMiddleware):
+    """
+    Bot session middleware passing Telegram API requests through a breaker.
+
+    Only network and server errors count as failures. While the breaker is
+    open requests fail with :class:`TelegramNetworkError`, so callers keep
+    handling them as before. Polling shares the session but bypasses the
+    breaker: long-poll timeouts aren't failures of the API calls the bot
+    makes, and the dispatcher backs off on its own.
+    """
+
+    def __init__(self, breaker: CircuitBreaker) -> None:
+        """
+        :param breaker: Circuit breaker of the Telegram API.
+        """
+        self.breaker = breaker
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if isinstance(method, GetUpdates):
+            return await make_request(bot, method)
+        if not self.breaker.allow():
+            raise TelegramNetworkError(
+                method=method, message=str(CircuitOpenError(self.breaker.name))
+            )
+        try:
+            response = await make_request(bot, method)
+        except asyncio.CancelledError:
+            self.breaker.probes = max(self.breaker.probes - 1, 0)
+            raise
+        except (TelegramNetworkError, TelegramServerError):
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return response
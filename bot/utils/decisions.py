@@ -0,0 +1,95 @@
+from collections import Counter
+from typing import Optional, Sequence
+
+from bot.utils.hysteresis import FlipGuard
+
+# actions the sweep can take for a user, None means there is nothing to do
+SKIP = "skip"  # balance couldn't be fetched
+BLACKLIST = "blacklist"
+BAN = "ban"
+UNBAN = "unban"
+HOLD = "hold"  # banned, above the threshold but still inside the hysteresis band
+BUY = "buy"
+SELL = "sell"
+
+
+def decide_actions(
+    balances: Sequence[int],
+    stored_balances: Sequence[int],
+    og: Sequence[bool],
+    banned: Sequence[bool],
+    blacklisted: Sequence[bool],
+    listed: Sequence[bool],
+    threshold: int,
+    og_threshold: int,
+    band: int = 0,
+) -> list[Optional[str]]:
+    """
+    Classifies a batch of users in a single pass without any side effects.
+
+    :param balances: Current WON + WON LP balances, negative if unknown.
+    :param stored_balances: Balances stored in the database.
+    :param og: Whether the user is an OG holder.
+    :param banned: Whether the user is banned.
+    :param blacklisted: Whether the user is already blacklisted in the database.
+    :param listed: Whether the user is on the blacklist file.
+    :param threshold: Balance required to stay in the community.
+    :param og_threshold: Balance required for OG holders.
+    :param band: Extra balance above the threshold required for an unban.
+    :return: Action per user, aligned with the input sequences.
+    """
+    actions = []
+    for balance, stored, is_og, is_banned, is_blacklisted, is_listed in zip(
+        balances, stored_balances, og, banned, blacklisted, listed
+    ):
+        user_threshold = og_threshold if is_og else threshold
+        if is_blacklisted:
+            action = None
+        elif is_listed:
+            action = BLACKLIST
+        elif balance < 0:
+            action = SKIP
+        elif balance < user_threshold and not is_banned:
+            action = BAN
+        elif is_banned and balance >= user_threshold + band:
+            action = UNBAN
+        elif is_banned and balance >= user_threshold:
+            action = HOLD
+        elif not is_banned and balance != stored:
+            action = BUY if balance > stored else SELL
+        else:
+            action = None
+        actions.append(action)
+    return actions
+
+
+def guard_action(
+    action: Optional[str],
+    flip_guard: FlipGuard,
+    user_id: int,
+    balance: int,
+    stored_balance: int,
+) -> tuple[Optional[str], bool]:
+    """
+    Debounces a planned ban/unban with the flip guard.
+
+    A ban that is not confirmed yet still records the balance change as a
+    buy/sell, an unconfirmed unban or a held user is left as is. A held user
+    counts as a suppressed flip once, when entering the band.
+
+    :return: The action to take and whether a flip was suppressed.
+    """
+    if action == HOLD:
+        return None, flip_guard.hold(user_id)
+    if action not in (BAN, UNBAN):
+        flip_guard.reset(user_id)
+        return action, False
+    if flip_guard.allow(user_id, action):
+        return action, False
+    if action == UNBAN or balance == stored_balance:
+        return None, True
+    return (BUY if balance > stored_balance else SELL), True
+
+
+def count_actions(actions: Sequence[Optional[str]]) -> Counter:
+    return Counter(action for action in actions if action is not None)
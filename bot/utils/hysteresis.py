@@ -0,0 +1,46 @@
+class FlipGuard:
+    """
+    Debounces ban/unban decisions of users hovering around the threshold.
+
+    An action is taken only after it was due on `confirmations` consecutive
+    sweeps. The hysteresis band itself is applied by the decision engine.
+    """
+
+    def __init__(self, confirmations: int) -> None:
+        """
+        :param confirmations: Number of consecutive sweeps an action must be due.
+        """
+        self.confirmations = confirmations
+        self.pending: dict[int, tuple[str, int]] = {}
+        # banned users held inside the hysteresis band
+        self.held: set[int] = set()
+
+    def allow(self, user_id: int, action: str) -> bool:
+        """Registers a due action and tells whether it should be taken now."""
+        self.held.discard(user_id)
+        pending_action, count = self.pending.get(user_id, (action, 0))
+        count = count + 1 if pending_action == action else 1
+        if count >= self.confirmations:
+            self.pending.pop(user_id, None)
+            return True
+
+        self.pending[user_id] = (action, count)
+        return False
+
+    def hold(self, user_id: int) -> bool:
+        """
+        Registers a banned user inside the hysteresis band.
+
+        :return: Whether the user just entered the band, i.e. would have
+            been unbanned on this sweep without it.
+        """
+        self.pending.pop(user_id, None)
+        if user_id in self.held:
+            return False
+        self.held.add(user_id)
+        return True
+
+    def reset(self, user_id: int) -> None:
+        """Forgets the pending action of a user whose state is stable again."""
+        self.pending.pop(user_id, None)
+        self.held.discard(user_id)
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+
+
+class PooledLink(NamedTuple):
+    invite_link: str
+    expire_date: int
+
+
+class InviteLinkPool:
+    """Keeps single-use invite links pre-created for each chat/channel."""
+
+    def __init__(
+        self,
+        bot: Bot,
+        chat_ids: list[int],
+        size: int,
+        ttl: int,
+        min_ttl: int,
+    ) -> None:
+        """
+        :param bot: Bot instance used to create and revoke links.
+        :param chat_ids: Chats and channels to keep links for.
+        :param size: Number of links kept ready per chat.
+        :param ttl: Lifetime of a created link in seconds.
+        :param min_ttl: Links with less lifetime left are not handed out anymore.
+        """
+        self.bot = bot
+        self.size = size
+        self.ttl = ttl
+        self.min_ttl = min_ttl
+        self.links: dict[int, deque[PooledLink]] = {
+            chat_id: deque() for chat_id in chat_ids
+        }
+        self.stale: dict[int, list[PooledLink]] = {chat_id: [] for chat_id in chat_ids}
+        self._refill_lock = asyncio.Lock()
+        self._background_tasks: set[asyncio.Task] = set()
+
+    async def _create(self, chat_id: int, name: Optional[str] = None) -> PooledLink:
+        expire_date = int(time.time()) + self.ttl
+        invite = await self.bot.create_chat_invite_link(
+            chat_id=chat_id,
+            name=name[:32] if name else None,
+            member_limit=1,
+            expire_date=expire_date,
+        )
+        return PooledLink(invite_link=invite.invite_link, expire_date=expire_date)
+
+    async def _rename(self, chat_id: int, link: PooledLink, name: str) -> None:
+        try:
+            await self.bot.edit_chat_invite_link(
+                chat_id=chat_id,
+                invite_link=link.invite_link,
+                name=name[:32],
+                member_limit=1,
+                expire_date=link.expire_date,
+            )
+        except TelegramAPIError as e:
+            logging.error("Can't rename invite link: %s", e.message)
+
+    def _pop_fresh(self, chat_id: int) -> Optional[PooledLink]:
+        links = self.links[chat_id]
+        deadline = int(time.time()) + self.min_ttl
+        while links:
+            link = links.popleft()
+            if link.expire_date >= deadline:
+                return link
+            self.stale[chat_id].append(link)
+        return None
+
+    async def take(self, chat_id: int, name: Optional[str] = None) -> PooledLink:
+        """Hands out a ready link, creating one on the spot if the pool is empty."""
+        link = self._pop_fresh(chat_id)
+        if link is None:
+            return await self._create(chat_id, name)
+        if name:
+            # the user doesn't need to wait for the link to be renamed
+            task = asyncio.create_task(self._rename(chat_id, link, name))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+        return link
+
+    async def refill(self) -> None:
+        """Revokes expiring unused links and tops the pool up to its size."""
+        async with self._refill_lock:
+            for chat_id, links in self.links.items():
+                deadline = int(time.time()) + self.min_ttl
+                while links and links[0].expire_date < deadline:
+                    self.stale[chat_id].append(links.popleft())
+
+                stale, self.stale[chat_id] = self.stale[chat_id], []
+                await asyncio.gather(
+                    *(
+                        self.bot.revoke_chat_invite_link(chat_id, link.invite_link)
+                        for link in stale
+                    ),
+                    return_exceptions=True,
+                )
+
+                while len(links) < self.size:
+                    try:
+                        links.append(await self._create(chat_id))
+                    except TelegramAPIError as e:
+                        logging.error("Can't refill invite link pool: %s", e.message)
+                        break
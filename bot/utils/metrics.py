@@ -0,0 +1,183 @@
+import asyncio
+import functools
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Iterable
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiohttp import web
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+from bot.utils.tracing import record_span
+
+SWEEP_DURATION = Histogram(
+    "bot_sweep_duration_seconds",
+    "Duration of balance sweeps",
+    buckets=(10, 30, 60, 120, 300, 600, 1200, 1800, 3600),
+)
+SWEEP_USERS = Counter("bot_sweep_users_total", "Users handled by sweeps", ["result"])
+SWEEP_ACTIONS = Counter(
+    "bot_sweep_actions_total", "Actions taken by sweeps", ["action"]
+)
+SWEEP_DEFERRED = Counter(
+    "bot_sweep_deferred_total", "Sweeps deferred because dependencies are down"
+)
+
+EXTERNAL_CALLS = Counter(
+    "bot_external_calls_total",
+    "Calls to external services",
+    ["service", "method", "outcome"],
+)
+EXTERNAL_CALL_DURATION = Histogram(
+    "bot_external_call_duration_seconds",
+    "Latency of calls to external services",
+    ["service", "method"],
+)
+HEDGED_REQUESTS = Counter(
+    "bot_balance_hedged_requests_total", "Balance lookups hedged to another provider"
+)
+BALANCE_DRIFTS = Counter(
+    "bot_balance_drifts_total", "Cross-checked balances that differ between providers"
+)
+
+USER_OPERATION_DURATION = Histogram(
+    "bot_user_operation_duration_seconds",
+    "Duration of user management operations",
+    ["operation"],
+)
+CONNECT_DURATION = Histogram(
+    "bot_connect_duration_seconds", "Duration of the wallet connect flow"
+)
+
+DB_TRANSACTION_DURATION = Histogram(
+    "bot_db_transaction_duration_seconds",
+    "Duration of unit of work transactions",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+UPDATE_DURATION = Histogram(
+    "bot_update_duration_seconds", "End to end handling time of updates", ["type"]
+)
+SLOW_UPDATES = Counter(
+    "bot_slow_updates_total", "Updates handled slower than the budget", ["type"]
+)
+
+WARMUP_DURATION = Gauge(
+    "bot_warmup_duration_seconds", "Duration of the startup warm-up steps", ["step"]
+)
+READY = Gauge("bot_ready", "Whether the startup warm-up is over")
+
+THROTTLED_UPDATES = Counter(
+    "bot_throttled_updates_total", "Updates dropped by throttling", ["key"]
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "bot_event_loop_lag_seconds",
+    "Delay of event loop callbacks",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+DB_POOL = Gauge("bot_db_pool", "Database connection pool state", ["stat"])
+CIRCUIT_BREAKER_OPEN = Gauge(
+    "bot_circuit_breaker_open", "Whether a circuit breaker is open", ["name"]
+)
+
+
+@asynccontextmanager
+async def observe_call(service: str, method: str):
+    """Counts a call to an external service and records its latency."""
+    started = time.monotonic()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        EXTERNAL_CALLS.labels(service, method, outcome).inc()
+        EXTERNAL_CALL_DURATION.labels(service, method).observe(
+            time.monotonic() - started
+        )
+        record_span(f"{service}.{method}", started)
+
+
+def timed_operation(operation: str):
+    """Decorator recording the duration of a user management coroutine."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with USER_OPERATION_DURATION.labels(operation).time():
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def track_db_pool(get_pool_status: Callable[[], dict]) -> None:
+    """Exposes the connection pool state, read on every scrape."""
+    for stat in get_pool_status():
+        DB_POOL.labels(stat).set_function(
+            functools.partial(lambda stat: get_pool_status()[stat], stat)
+        )
+
+
+def track_breakers(breakers: Iterable) -> None:
+    """Exposes whether each circuit breaker is open, read on every scrape."""
+    for breaker in breakers:
+        CIRCUIT_BREAKER_OPEN.labels(breaker.name).set_function(
+            functools.partial(lambda breaker: float(breaker.is_open), breaker)
+        )
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """
+    Bot session middleware counting Telegram API requests and their latency.
+    """
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        async with observe_call("telegram", method.__api_method__):
+            return await make_request(bot, method)
+
+
+async def monitor_event_loop_lag(interval: float = 1) -> None:
+    """Measures how late the event loop wakes up a sleeping task."""
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(time.monotonic() - started - interval, 0))
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(
+        body=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST}
+    )
+
+
+async def start_metrics_server(port: int, host: str = "127.0.0.1") -> web.AppRunner:
+    """Serves /metrics on the given address."""
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    return runner
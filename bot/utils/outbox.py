@@ -0,0 +1,229 @@
+import asyncio
+import logging
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from aiohttp import ClientError
+from aiogram.types import InlineKeyboardMarkup
+from aiogram.utils import markdown
+
+from bot.config import settings
+from bot.db.schemas.schema_outbox import OutboxSchema, OutboxSchemaAdd
+from bot.db.schemas.schema_users import UserSchema
+from bot.db.services.service_outbox import OutboxService
+from bot.db.services.service_users import UsersService
+from bot.db.utils.unitofwork import UnitOfWork
+from bot.utils.circuit_breaker import CircuitOpenError
+
+
+def send_message_entry(
+    key: str,
+    chat_id: int,
+    text: str,
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+    banned_user_id: Optional[int] = None,
+) -> OutboxSchemaAdd:
+    """
+    Returns an outbox entry sending a message.
+
+    :param banned_user_id: For a ban notice, the user it is about; the message
+        is dropped if they were unbanned before it was sent.
+    """
+    return OutboxSchemaAdd(
+        key=f"{key}:send_message",
+        action="send_message",
+        payload={
+            "chat_id": chat_id,
+            "text": text,
+            "reply_markup": (
+                reply_markup.model_dump(exclude_none=True) if reply_markup else None
+            ),
+            "banned_user_id": banned_user_id,
+        },
+    )
+
+
+def notify_admin_entry(
+    key: str, type_: str, user: UserSchema, sum_: int = None
+) -> OutboxSchemaAdd:
+    return OutboxSchemaAdd(
+        key=f"{key}:notify_admin",
+        action="notify_admin",
+        payload={"type_": type_, "user": user.model_dump(mode="json"), "sum_": sum_},
+    )
+
+
+class OutboxDispatcher:
+    """Drains the outbox, performing queued Telegram actions with retries."""
+
+    def __init__(
+        self,
+        bot: Bot,
+        uow: UnitOfWork,
+        user_manager: "UserManager",
+        admin_notifier: "AdminNotifier",
+        batch_size: int,
+        lease: int,
+        max_attempts: int,
+        retry_delay: float,
+    ) -> None:
+        """
+        :param bot: Bot instance performing the actions.
+        :param uow: UnitOfWork instance for interacting with the database.
+        :param user_manager: UserManager instance for unbanning users.
+        :param admin_notifier: AdminNotifier instance for notifying the admin channel.
+        :param batch_size: Number of entries claimed per run.
+        :param lease: Seconds a claimed entry is hidden from other dispatchers.
+        :param max_attempts: Attempts after which an entry is marked failed.
+        :param retry_delay: Base delay in seconds, doubled after every failed attempt.
+        """
+        self.bot = bot
+        self.uow = uow
+        self.user_manager = user_manager
+        self.admin_notifier = admin_notifier
+        self.batch_size = batch_size
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.handlers = {
+            "ban": self._ban,
+            "unban": self._unban,
+            "send_message": self._send_message,
+            "notify_admin": self._notify_admin,
+        }
+
+    async def _ban(self, entry: OutboxSchema):
+        payload = entry.payload
+        tg_user_id = payload["tg_user_id"]
+        if "user_id" in payload:
+            user = await UsersService().get_user(
+                uow=self.uow, user_id=payload["user_id"]
+            )
+        else:
+            # queued before the payload carried the user id
+            user = await UsersService().get_user_by_tg_id(
+                uow=self.uow, tg_user_id=tg_user_id
+            )
+        # the user got unbanned before the action ran
+        if not user.banned:
+            return
+        await self.bot.ban_chat_member(chat_id=settings.CHAT_ID, user_id=tg_user_id)
+        await self.bot.ban_chat_member(chat_id=settings.CHANNEL_ID, user_id=tg_user_id)
+        if payload.get("invite_link"):
+            await self.bot.revoke_chat_invite_link(
+                settings.CHAT_ID, payload["invite_link"]
+            )
+        if payload.get("channel_invite_link"):
+            await self.bot.revoke_chat_invite_link(
+                settings.CHANNEL_ID, payload["channel_invite_link"]
+            )
+
+    async def _unban(self, entry: OutboxSchema):
+        user = await UsersService().get_user(
+            uow=self.uow, user_id=entry.payload["user_id"]
+        )
+        # the user got banned again before the action ran
+        if user.banned:
+            return
+        user = await self.user_manager.unban_user(
+            user=user, history_entry=None, notify_admin=False, record=False
+        )
+        message_text = (
+            f"Кошелек {markdown.hcode(user.wallet)} пополнен, вы можете вернуться в коммьюнити!\n\n"
+            f"Ссылка для вступления в чат: {user.invite_link}\n\n"
+            f"Ссылка для подписки на канал: {user.channel_invite_link}"
+        )
+        await OutboxService().add_entries(
+            uow=self.uow,
+            entries=[send_message_entry(entry.key, user.tg_user_id, message_text)],
+        )
+
+    async def _send_message(self, entry: OutboxSchema):
+        payload = entry.payload
+        if payload.get("banned_user_id") is not None:
+            user = await UsersService().get_user(
+                uow=self.uow, user_id=payload["banned_user_id"]
+            )
+            # a ban notice of a user unbanned meanwhile, like the ban itself
+            if not user.banned:
+                return
+        reply_markup = payload.get("reply_markup")
+        await self.bot.send_message(
+            chat_id=payload["chat_id"],
+            text=payload["text"],
+            reply_markup=(
+                InlineKeyboardMarkup.model_validate(reply_markup)
+                if reply_markup
+                else None
+            ),
+        )
+
+    async def _notify_admin(self, entry: OutboxSchema):
+        payload = entry.payload
+        await self.admin_notifier.notify_admin(
+            type_=payload["type_"],
+            user=UserSchema.model_validate(payload["user"]),
+            sum_=payload.get("sum_"),
+        )
+
+    async def _dispatch_one(self, entry: OutboxSchema):
+        retry_delay = self.retry_delay * 2**entry.attempts
+        give_up = False
+        count_attempt = True
+        try:
+            await self.handlers[entry.action](entry)
+        except TelegramRetryAfter as e:
+            error = e.message
+            retry_delay = e.retry_after
+        except (
+            TelegramNetworkError,
+            TelegramServerError,
+            CircuitOpenError,
+            ClientError,
+            asyncio.TimeoutError,
+        ) as e:
+            # Telegram is unreachable, the entry itself is fine: retry it
+            # for as long as the outage lasts, a dropped ban would leave
+            # a banned user in the chat
+            error = getattr(e, "message", None) or repr(e)
+            count_attempt = False
+        except (TelegramBadRequest, TelegramForbiddenError) as e:
+            # retrying won't help, e.g. the user blocked the bot
+            error = e.message
+            give_up = True
+        except TelegramAPIError as e:
+            error = e.message
+        except Exception as e:
+            logging.exception("Exception in outbox action %s: %s", entry.key, e)
+            error = repr(e)
+        else:
+            await OutboxService().complete(uow=self.uow, entry=entry)
+            return
+
+        logging.error("Outbox action %s failed: %s", entry.key, error)
+        await OutboxService().fail(
+            uow=self.uow,
+            entry=entry,
+            error=error,
+            retry_delay=retry_delay,
+            give_up=give_up
+            or (count_attempt and entry.attempts + 1 >= self.max_attempts),
+            count_attempt=count_attempt,
+        )
+
+    async def dispatch(self) -> int:
+        """Performs due outbox entries one by one and returns how many were claimed."""
+        entries = await OutboxService().claim_due(
+            uow=self.uow, limit=self.batch_size, lease=self.lease
+        )
+        for entry in entries:
+            await self._dispatch_one(entry)
+        return len(entries)
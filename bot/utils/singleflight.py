@@ -0,0 +1,70 @@
+import asyncio
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from redis.asyncio import Redis
+
+
+class SingleFlight:
+    """Merges concurrent calls with the same key into a single in-flight call."""
+
+    def __init__(self) -> None:
+        self.calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs fn unless a call with the same key is already running,
+        in which case its result is awaited instead.
+
+        :param key: Key identifying the call.
+        :param fn: Coroutine function performing the call.
+        :return: Result of the (possibly shared) call.
+        """
+        future = self.calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self.calls[key] = future
+            future.add_done_callback(lambda _: self.calls.pop(key, None))
+        # a cancelled caller must not cancel the call other callers wait for
+        return await asyncio.shield(future)
+
+
+class RedisSingleFlight(SingleFlight):
+    """
+    Single flight shared between processes.
+
+    Calls are merged locally as in SingleFlight, and a call whose key is
+    already locked in Redis by another process is dropped.
+    """
+
+    # deletes the lock only if it still belongs to the caller
+    RELEASE_SCRIPT = """
+    if redis.call("get", KEYS[1]) == ARGV[1] then
+        return redis.call("del", KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, redis: Redis, prefix: str, ttl: int) -> None:
+        """
+        :param redis: Redis client holding the locks.
+        :param prefix: Prefix of the lock keys.
+        :param ttl: Lock expiration in seconds, in case the holder dies.
+        """
+        super().__init__()
+        self.redis = redis
+        self.prefix = prefix
+        self.ttl = ttl
+
+    async def _locked(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        lock_key = f"{self.prefix}:{key}"
+        token = uuid.uuid4().hex
+        if not await self.redis.set(lock_key, token, nx=True, ex=self.ttl):
+            return None
+        try:
+            return await fn()
+        finally:
+            await self.redis.eval(self.RELEASE_SCRIPT, 1, lock_key, token)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        return await super().do(key, lambda: self._locked(key, fn))
@@ -0,0 +1,57 @@
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Trace:
+    """Spans recorded while handling an update."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.started = time.monotonic()
+        # (name, start offset, duration) in seconds
+        self.spans: list[tuple[str, float, float]] = []
+
+    def add(self, name: str, started: float, finished: float) -> None:
+        self.spans.append((name, started - self.started, finished - started))
+
+    def format(self) -> str:
+        """Returns the spans one per line, in the order they started."""
+        return "\n".join(
+            f"  +{offset:.3f}s {name}: {duration:.3f}s"
+            for name, offset, duration in sorted(self.spans, key=lambda s: s[1])
+        )
+
+
+# trace of the update being handled, None outside of updates; tasks
+# spawned while handling it inherit the trace
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def record_span(name: str, started: float) -> None:
+    """Adds a span that started at the given monotonic time and ends now."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(name, started, time.monotonic())
+
+
+async def traced(name: str, aw: Awaitable[T]) -> T:
+    """Awaits aw as a span of the current trace."""
+    async with span(name):
+        return await aw
+
+
+@asynccontextmanager
+async def span(name: str):
+    """Records the enclosed block as a span of the current trace, if any."""
+    if current_trace.get() is None:
+        yield
+        return
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        record_span(name, started)
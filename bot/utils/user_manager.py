@@ -1,5 +1,10 @@
-import time
+import asyncio
+import datetime
+import logging
+from typing import Optional
+
 from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
 from aiogram.types import ChatMemberMember
 
 from bot.config import settings
@@ -7,16 +12,54 @@ from bot.db.services.service_users import UsersService
 from bot.db.utils.unitofwork import UnitOfWork
 from bot.db.schemas.schema_users import UserSchema
 from bot.db.schemas.schema_history import HistorySchemaAdd
+from bot.db.schemas.schema_outbox import OutboxSchemaAdd
+from bot.utils.invite_pool import InviteLinkPool, PooledLink
+from bot.utils.metrics import timed_operation
+from bot.utils.outbox import notify_admin_entry
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def utc_from_timestamp(timestamp: int) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).replace(
+        tzinfo=None
+    )
 
 
 class UserManager:
     """Class for managing user actions such as banning, unbanning, and revoking invite links."""
 
-    def __init__(self, bot: Bot, admin_notifier: "AdminNotifier", uow: UnitOfWork):
+    def __init__(
+        self,
+        bot: Bot,
+        admin_notifier: "AdminNotifier",
+        uow: UnitOfWork,
+        invite_pool: InviteLinkPool,
+    ):
         self.bot: Bot = bot
         self.admin_notifier: "AdminNotifier" = admin_notifier
         self.uow: UnitOfWork = uow
+        self.invite_pool: InviteLinkPool = invite_pool
 
+    @staticmethod
+    def record_action(
+        user: UserSchema, history_entry: Optional[HistorySchemaAdd], action: str
+    ) -> HistorySchemaAdd:
+        """
+        Returns the history entry marked with a ban or unban action.
+
+        Without an entry a balance-neutral one is created, so every ban and
+        unban shows up in history whatever path it took.
+        """
+        if history_entry is None:
+            history_entry = HistorySchemaAdd(
+                user_id=user.id, balance_delta=0, wallet=user.wallet
+            )
+        return history_entry.model_copy(update={"action": action})
+
+    @timed_operation("ban_user")
     async def ban_user(
         self,
         user: UserSchema,
@@ -35,7 +78,10 @@ class UserManager:
 
         user.banned = True
         await UsersService().edit_user(
-            uow=self.uow, user_id=user.id, user=user, history_entry=history_entry
+            uow=self.uow,
+            user_id=user.id,
+            user=user,
+            history_entry=self.record_action(user, history_entry, "ban"),
         )
 
         if notify_admin:
@@ -43,46 +89,104 @@ class UserManager:
 
         return user
 
-    async def revoke_old_user_invite_links(self, user: UserSchema) -> UserSchema:
-        """Revokes the invite links for a user if the user is already in the chat/channel."""
-        modified = False
-        if user.invite_link:
-            existing_member = await self.bot.get_chat_member(
-                chat_id=settings.CHAT_ID, user_id=user.tg_user_id
+    @staticmethod
+    def assign_invite_links(
+        user: UserSchema,
+        invite: Optional[PooledLink],
+        channel_invite: Optional[PooledLink],
+    ) -> UserSchema:
+        """Stores invite links on the user along with their issue and expiry times."""
+        now = utcnow()
+        user.invite_link = invite.invite_link if invite else None
+        user.invite_link_created_at = now if invite else None
+        user.invite_link_expires_at = (
+            utc_from_timestamp(invite.expire_date) if invite else None
+        )
+        user.channel_invite_link = (
+            channel_invite.invite_link if channel_invite else None
+        )
+        user.channel_invite_link_created_at = now if channel_invite else None
+        user.channel_invite_link_expires_at = (
+            utc_from_timestamp(channel_invite.expire_date) if channel_invite else None
+        )
+        return user
+
+    async def _is_link_spent(
+        self,
+        chat_id: int,
+        user: UserSchema,
+        invite_link: Optional[str],
+        expires_at: Optional[datetime.datetime],
+        now: datetime.datetime,
+    ) -> bool:
+        """Checks whether a stored link expired or was used and revokes a used one."""
+        if not invite_link:
+            return False
+        # expired links can't be used anymore, there is nothing to revoke
+        if expires_at is not None and expires_at <= now:
+            return True
+        existing_member = await self.bot.get_chat_member(
+            chat_id=chat_id, user_id=user.tg_user_id
+        )
+        if isinstance(existing_member, ChatMemberMember):
+            await self.bot.revoke_chat_invite_link(chat_id, invite_link)
+            return True
+        return False
+
+    async def _reap_user_invite_links(
+        self, user: UserSchema, now: datetime.datetime
+    ) -> tuple[bool, bool]:
+        try:
+            return await asyncio.gather(
+                self._is_link_spent(
+                    settings.CHAT_ID,
+                    user,
+                    user.invite_link,
+                    user.invite_link_expires_at,
+                    now,
+                ),
+                self._is_link_spent(
+                    settings.CHANNEL_ID,
+                    user,
+                    user.channel_invite_link,
+                    user.channel_invite_link_expires_at,
+                    now,
+                ),
             )
-            if isinstance(existing_member, ChatMemberMember):
-                await self.bot.revoke_chat_invite_link(
-                    settings.CHAT_ID, user.invite_link
-                )
-                user.invite_link = None
-                modified = True
+        except TelegramAPIError as e:
+            logging.error("TelegramAPIError in reap_invite_links(): %s", e.message)
+            return False, False
 
-        if user.channel_invite_link:
-            existing_member = await self.bot.get_chat_member(
-                chat_id=settings.CHANNEL_ID, user_id=user.tg_user_id
+    @timed_operation("reap_invite_links")
+    async def reap_invite_links(self, batch_size: int):
+        """Clears stored invite links that expired or were used, revoking used ones."""
+        users = await UsersService().get_users_with_invite_links(uow=self.uow)
+        now = utcnow()
+        for i in range(0, len(users), batch_size):
+            batch = users[i : i + batch_size]
+            results = await asyncio.gather(
+                *(self._reap_user_invite_links(user, now) for user in batch)
+            )
+            await UsersService().clear_invite_links(
+                uow=self.uow,
+                chat_users=[user for user, (chat, _) in zip(batch, results) if chat],
+                channel_users=[
+                    user for user, (_, channel) in zip(batch, results) if channel
+                ],
             )
-            if isinstance(existing_member, ChatMemberMember):
-                await self.bot.revoke_chat_invite_link(
-                    settings.CHANNEL_ID, user.channel_invite_link
-                )
-                user.channel_invite_link = None
-                modified = True
-        if modified:
-            await UsersService().edit_user(uow=self.uow, user_id=user.id, user=user)
-        return user
 
+    @timed_operation("revoke_user_invite_links")
     async def revoke_user_invite_links(self, user: UserSchema) -> UserSchema:
         """Revokes the invite links for a user if they exist."""
         if user.invite_link:
             await self.bot.revoke_chat_invite_link(settings.CHAT_ID, user.invite_link)
-            user.invite_link = None
         if user.channel_invite_link:
             await self.bot.revoke_chat_invite_link(
                 settings.CHANNEL_ID, user.channel_invite_link
             )
-            user.channel_invite_link = None
-        return user
+        return self.assign_invite_links(user, None, None)
 
+    @timed_operation("unban_user")
     async def unban_user(
         self,
         user: UserSchema,
@@ -90,10 +194,15 @@ class UserManager:
         notify_admin: bool = True,
         notification_type: str = "unban",
         generate_new_invites: bool = True,
+        record: bool = True,
     ) -> UserSchema:
-        """Unbans a user and generates new invite links for them."""
+        """
+        Unbans a user and generates new invite links for them.
+
+        :param record: Whether to record the unban in history, the outbox
+            performs unbans that were recorded when they were queued.
+        """
         user.banned = False
-        expire_date = int(time.time()) + 86400  # +1 day from current unix timestamp
         await self.bot.unban_chat_member(
             chat_id=settings.CHAT_ID, user_id=user.tg_user_id
         )
@@ -102,21 +211,14 @@ class UserManager:
         )
         if generate_new_invites:
             await self.revoke_user_invite_links(user)
-            invite = await self.bot.create_chat_invite_link(
-                chat_id=settings.CHAT_ID,
-                name=user.username,
-                member_limit=1,
-                expire_date=expire_date,
+            invite, invite_channel = await asyncio.gather(
+                self.invite_pool.take(settings.CHAT_ID, name=user.username),
+                self.invite_pool.take(settings.CHANNEL_ID, name=user.username),
             )
-            invite_channel = await self.bot.create_chat_invite_link(
-                chat_id=settings.CHANNEL_ID,
-                name=user.username,
-                member_limit=1,
-                expire_date=expire_date,
-            )
-            user.invite_link = invite.invite_link
-            user.channel_invite_link = invite_channel.invite_link
+            self.assign_invite_links(user, invite, invite_channel)
 
+        if record:
+            history_entry = self.record_action(user, history_entry, "unban")
         await UsersService().edit_user(
             uow=self.uow, user_id=user.id, user=user, history_entry=history_entry
         )
@@ -125,3 +227,63 @@ class UserManager:
             await self.admin_notifier.notify_admin(type_=notification_type, user=user)
 
         return user
+
+    async def enqueue_ban(
+        self,
+        user: UserSchema,
+        history_entry: HistorySchemaAdd,
+        key: str,
+        outbox_entries: list[OutboxSchemaAdd] = None,
+        notification_type: str = "ban",
+    ) -> UserSchema:
+        """Marks a user banned and queues the Telegram side effects in the same transaction."""
+        entries = [
+            OutboxSchemaAdd(
+                key=f"{key}:ban",
+                action="ban",
+                payload={
+                    "user_id": user.id,
+                    "tg_user_id": user.tg_user_id,
+                    "invite_link": user.invite_link,
+                    "channel_invite_link": user.channel_invite_link,
+                },
+            ),
+            *(outbox_entries or []),
+            notify_admin_entry(key, notification_type, user),
+        ]
+        self.assign_invite_links(user, None, None)
+        user.banned = True
+        await UsersService().edit_user(
+            uow=self.uow,
+            user_id=user.id,
+            user=user,
+            history_entry=self.record_action(user, history_entry, "ban"),
+            outbox_entries=entries,
+        )
+        return user
+
+    async def enqueue_unban(
+        self,
+        user: UserSchema,
+        history_entry: HistorySchemaAdd,
+        key: str,
+    ) -> UserSchema:
+        """Marks a user unbanned and queues the Telegram side effects in the same transaction.
+
+        New invite links are created and sent to the user by the outbox dispatcher.
+        """
+        user.banned = False
+        entries = [
+            OutboxSchemaAdd(
+                key=f"{key}:unban", action="unban", payload={"user_id": user.id}
+            ),
+            notify_admin_entry(key, "unban", user),
+        ]
+        await UsersService().edit_user(
+            uow=self.uow,
+            user_id=user.id,
+            user=user,
+            history_entry=self.record_action(user, history_entry, "unban"),
+            outbox_entries=entries,
+        )
+        return user
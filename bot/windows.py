@@ -1,5 +1,5 @@
+import asyncio
 import logging
-import time
 import traceback
 
 from aiogram import Bot
@@ -18,12 +18,17 @@ from bot.db.schemas.schema_users import UserSchemaAdd
 from bot.db.services.service_users import UsersService
 from bot.db.utils.unitofwork import UnitOfWork
 from bot.keyboards import kb_buy_won
+from bot.middlewares.tracing import Tracer
 from bot.middlewares.util_middleware import (
     AdminNotifier,
     DeDustHelper,
     ListChecker,
     TonApiHelper,
 )
+from bot.utils.invite_pool import InviteLinkPool
+from bot.utils.metrics import CONNECT_DURATION
+from bot.utils.singleflight import SingleFlight
+from bot.utils.tracing import traced
 from bot.utils.user_manager import UserManager
 
 
@@ -37,6 +42,28 @@ async def empty_window(event_from_user: User, atc_manager: ATCManager, **_) -> N
 
 
 async def main_menu_window(
+    connect_flight: SingleFlight, tracer: Tracer, **data
+) -> None:
+    """
+    Displays the main menu window, running at most one connect flow per user.
+
+    A duplicate flow of the same user (a double tapped "disconnect" or a
+    repeated /start) waits for the running one instead of starting anew.
+    The flow runs outside of any update once the wallet is connected, so it
+    is traced on its own.
+
+    :param connect_flight: SingleFlight instance keyed by Telegram user id.
+    :param tracer: Tracer timing the connect flow.
+    :param data: Data from the middleware passed to show_main_menu().
+    :return: None
+    """
+    user_chat: Chat = data["event_context"].chat
+    with CONNECT_DURATION.time():
+        async with tracer.trace("connect", f"connect of {user_chat.id}"):
+            await connect_flight.do(user_chat.id, lambda: show_main_menu(**data))
+
+
+async def show_main_menu(
     atc_manager: ATCManager,
     app_wallet: AppWallet,
     account_wallet: AccountWallet,
@@ -47,6 +74,7 @@ async def main_menu_window(
     list_checker: ListChecker,
     admin_notifier: AdminNotifier,
     user_manager: UserManager,
+    invite_pool: InviteLinkPool,
     **_,
 ) -> None:
     """
@@ -61,6 +89,8 @@ async def main_menu_window(
     :param dedust_helper: DeDustHelper instance for interacting with the DeDust API.
     :param list_checker: ListChecker instance for checking user special lists.
     :param admin_notifier: AdminNotifier instance for notifying the admin channel.
+    :param user_manager: UserManager instance for banning and unbanning users.
+    :param invite_pool: InviteLinkPool instance handing out pre-created invite links.
     :param _: Unused data from the middleware.
     :return: None
     """
@@ -68,63 +98,169 @@ async def main_menu_window(
     bot: Bot = _["bots"][0]
     user_chat: Chat = _["event_context"].chat
 
-    try:
-        # delete ton connect message window
-        state_data = await atc_manager.state.get_data()
-        await bot.delete_message(
-            message_id=state_data.get("message_id"), chat_id=user_chat.id
+    def step(coro):
+        return asyncio.wait_for(coro, settings.CONNECT_STEP_TIMEOUT)
+
+    placeholder = None
+    answered = False
+
+    async def reply(text: str, reply_markup=None) -> None:
+        nonlocal answered
+        await bot.edit_message_text(
+            text=text,
+            chat_id=user_chat.id,
+            message_id=placeholder.message_id,
+            reply_markup=reply_markup,
         )
+        answered = True
 
-        price = await dedust_helper.get_jetton_price(settings.WON_ADDR)
+    async def reply_error() -> None:
+        # never leave the user with the placeholder after a failure
+        if placeholder is None or answered:
+            return
+        try:
+            await reply("Ошибка получения баланса. Попробуйте переподключиться.")
+        except TelegramAPIError as e:
+            logging.error("Failed to answer the connect: %s", e.message)
+
+    try:
+        # answer right away, the message is edited once the checks are done
+        placeholder = await bot.send_message(
+            chat_id=user_chat.id, text="Проверяем баланс…"
+        )
 
         invite_link_name = f"{user_chat.first_name} {user_chat.last_name or ''}"
         username = user_chat.username if user_chat.username else invite_link_name
-
         wallet = Address(account_wallet.address.hex_address).to_str()
-        won_balance = await ton_api_helper.get_jetton_balance(wallet, settings.WON_ADDR)
-        won_lp_balance = await ton_api_helper.get_jetton_balance(
-            wallet, settings.WON_LP_ADDR
-        )
+        state_data = await atc_manager.state.get_data()
 
-        if won_balance < 0 or won_lp_balance < 0:
-            await bot.send_message(
-                chat_id=user_chat.id,
-                text="Ошибка получения баланса. Попробуйте переподключиться.",
+        # all lookups are independent, run them concurrently
+        try:
+            (
+                _deleted,
+                price_sample,
+                jetton_balances,
+                existing_member,
+                channel_existing_member,
+                user,
+                wallet_users,
+            ) = await traced(
+                "connect.lookups",
+                asyncio.wait_for(
+                    asyncio.gather(
+                        # delete ton connect message window
+                        step(
+                            bot.delete_message(
+                                message_id=state_data.get("message_id"),
+                                chat_id=user_chat.id,
+                            )
+                        ),
+                        step(dedust_helper.get_price_sample(settings.WON_ADDR)),
+                        step(
+                            ton_api_helper.get_jetton_balances(
+                                wallet, (settings.WON_ADDR, settings.WON_LP_ADDR)
+                            )
+                        ),
+                        step(
+                            bot.get_chat_member(
+                                chat_id=settings.CHAT_ID, user_id=user_chat.id
+                            )
+                        ),
+                        step(
+                            bot.get_chat_member(
+                                chat_id=settings.CHANNEL_ID, user_id=user_chat.id
+                            )
+                        ),
+                        step(
+                            UsersService().get_user_by_tg_id(
+                                uow=uow, tg_user_id=user_chat.id
+                            )
+                        ),
+                        step(
+                            UsersService().get_users_by_wallet(uow=uow, wallet=wallet)
+                        ),
+                        return_exceptions=True,
+                    ),
+                    settings.CONNECT_DEADLINE,
+                ),
             )
+        except asyncio.TimeoutError:
+            logging.error("main_menu_window() deadline exceeded")
+            await reply("Ошибка получения баланса. Попробуйте переподключиться.")
             return
 
-        won_balance = won_balance + won_lp_balance
+        if isinstance(price_sample, Exception):
+            logging.error("DeDust price lookup failed: %r", price_sample)
+            price_sample = None
+        price = price_sample.price if price_sample is not None else 0
+        if isinstance(jetton_balances, Exception):
+            logging.error("Balance lookup failed: %r", jetton_balances)
+        for result in (existing_member, channel_existing_member):
+            if isinstance(result, Exception):
+                raise result
+        if isinstance(user, Exception) and not isinstance(user, NoResultFound):
+            raise user
+        if isinstance(wallet_users, Exception):
+            raise wallet_users
+
+        if isinstance(jetton_balances, Exception) or min(jetton_balances.values()) < 0:
+            await reply("Ошибка получения баланса. Попробуйте переподключиться.")
+            return
+
+        won_balance = sum(jetton_balances.values())
+
+        if isinstance(user, NoResultFound):
+            og = list_checker.check_og(user_chat.username)
+        else:
+            og = user.og
+        if og:
+            threshold_balance = settings.OG_THRESHOLD_BALANCE
+        else:
+            threshold_balance = settings.THRESHOLD_BALANCE
+
+        # a cached balance is only trusted when it lets the user in, one that
+        # would deny or ban them is read again: they may have just topped up
+        # as the ban message asks
+        if won_balance < threshold_balance:
+            try:
+                jetton_balances = await traced(
+                    "connect.fresh_balance",
+                    step(
+                        ton_api_helper.get_jetton_balances(
+                            wallet,
+                            (settings.WON_ADDR, settings.WON_LP_ADDR),
+                            use_cache=False,
+                        )
+                    ),
+                )
+            except asyncio.TimeoutError:
+                jetton_balances = {settings.WON_ADDR: -1}
+            if min(jetton_balances.values()) < 0:
+                await reply("Ошибка получения баланса. Попробуйте переподключиться.")
+                return
+            won_balance = sum(jetton_balances.values())
 
-        existing_member = await bot.get_chat_member(
-            chat_id=settings.CHAT_ID, user_id=user_chat.id
-        )
-        channel_existing_member = await bot.get_chat_member(
-            chat_id=settings.CHANNEL_ID, user_id=user_chat.id
-        )
         is_in_chat = isinstance(existing_member, ChatMemberMember)
         is_in_channel = isinstance(channel_existing_member, ChatMemberMember)
 
         history_entry = HistorySchemaAdd(
             user_id=0,
             balance_delta=0,
-            price=-1.0,
+            price_id=price_sample.id if price_sample is not None else None,
             wallet=wallet,
         )
 
-        try:
-            user = await UsersService().get_user_by_tg_id(
-                uow=uow, tg_user_id=user_chat.id
-            )
+        if not isinstance(user, NoResultFound):
             is_new_user = False
             user.balance = won_balance
             history_entry.user_id = user.id
             history_entry.balance_delta = won_balance - user.balance
-        except NoResultFound:
+        else:
             user = UserSchemaAdd(
                 username=username,
                 balance=won_balance,
                 blacklisted=list_checker.check_blacklist(user_chat.username),
-                og=list_checker.check_og(user_chat.username),
+                og=og,
                 entry_balance=won_balance,
                 banned=False,
                 wallet=wallet,
@@ -136,10 +272,24 @@ async def main_menu_window(
 
         await admin_notifier.notify_admin(type_="connect", user=user)
 
-        if user.og:
-            threshold_balance = settings.OG_THRESHOLD_BALANCE
-        else:
-            threshold_balance = settings.THRESHOLD_BALANCE
+        # other accounts that already connected this wallet
+        other_users = [
+            other for other in wallet_users if other.tg_user_id != user_chat.id
+        ]
+        if other_users:
+            await admin_notifier.notify_shared_wallet(
+                user=user.model_copy(update={"wallet": wallet}),
+                other_users=other_users,
+            )
+            if settings.BLOCK_SHARED_WALLETS:
+                kb = await kb_buy_won(settings=settings, price=price, disconnect=True)
+                await reply(
+                    f"Кошелек {markdown.hcode(wallet)} уже подключен к другому "
+                    f"аккаунту. Подключите другой кошелек.",
+                    reply_markup=kb,
+                )
+                await atc_manager.state.set_state(UserState.main_menu)
+                return
 
         invite_link_text = f"Мало WON на балансе. Надо не меньше {markdown.hcode(threshold_balance)}\n\n"
         channel_invite_link_text = ""
@@ -149,26 +299,27 @@ async def main_menu_window(
             channel_invite_link_text = (
                 f"Канал: {markdown.hitalic('Вы уже подписаны на канал')}.\n\n"
             )
+            invite_link = channel_invite_link = None
 
             if not user.blacklisted:
-                expire_date = (
-                    int(time.time()) + 86400
-                )  # +1 day from current unix timestamp
+                invite_link, channel_invite_link = await traced(
+                    "connect.invite_links",
+                    asyncio.gather(
+                        (
+                            invite_pool.take(settings.CHAT_ID, name=invite_link_name)
+                            if not is_in_chat
+                            else asyncio.sleep(0)
+                        ),
+                        (
+                            invite_pool.take(settings.CHANNEL_ID, name=invite_link_name)
+                            if not is_in_channel
+                            else asyncio.sleep(0)
+                        ),
+                    ),
+                )
                 if not is_in_chat:
-                    invite_link = await bot.create_chat_invite_link(
-                        chat_id=settings.CHAT_ID,
-                        name=invite_link_name,
-                        member_limit=1,
-                        expire_date=expire_date,
-                    )
                     invite_link_text = f"Вступить в чат: {invite_link.invite_link}\n"
                 if not is_in_channel:
-                    channel_invite_link = await bot.create_chat_invite_link(
-                        chat_id=settings.CHANNEL_ID,
-                        name=invite_link_name,
-                        member_limit=1,
-                        expire_date=expire_date,
-                    )
                     channel_invite_link_text = (
                         f"Подписаться на канал: {channel_invite_link.invite_link}\n"
                     )
@@ -177,8 +328,7 @@ async def main_menu_window(
                 channel_invite_link_text = ""
 
             if is_new_user:
-                user.invite_link = invite_link.invite_link
-                user.channel_invite_link = channel_invite_link.invite_link
+                user_manager.assign_invite_links(user, invite_link, channel_invite_link)
                 await UsersService().add_user(
                     uow=uow,
                     user=user,
@@ -199,13 +349,8 @@ async def main_menu_window(
 
                         await user_manager.revoke_user_invite_links(user)
                         logging.error("UNBAN in windows.py: %s", user.username)
-                        user.invite_link = (
-                            invite_link.invite_link if not is_in_chat else None
-                        )
-                        user.channel_invite_link = (
-                            channel_invite_link.invite_link
-                            if not is_in_channel
-                            else None
+                        user_manager.assign_invite_links(
+                            user, invite_link, channel_invite_link
                         )
                         await user_manager.unban_user(
                             user=user,
@@ -237,7 +382,7 @@ async def main_menu_window(
         )
         kb = await kb_buy_won(settings=settings, price=price, disconnect=True)
 
-        await bot.send_message(chat_id=user_chat.id, text=text, reply_markup=kb)
+        await reply(text, reply_markup=kb)
         await atc_manager.state.set_state(UserState.main_menu)
     except TelegramAPIError as e:
         logging.error(
@@ -246,5 +391,7 @@ async def main_menu_window(
             e.method,
             e.message,
         )
+        await reply_error()
     except Exception as e:
         logging.exception("Exception in main_menu_window(): %s", e)
+        await reply_error()